@@ -2,11 +2,15 @@
 """
 This module contains the API app instance
 """
-from flask import Flask, make_response, jsonify
+from flask import Flask, make_response, jsonify, g, request
 from models import storage
 from api.v1.views import app_views
+from api.v1.views.index import stats_ttl
+from api.v1.cache import ResponseCache
 from os import getenv
 from flask_cors import CORS
+import time
+from uuid import uuid4
 
 
 app = Flask(__name__)
@@ -16,6 +20,88 @@ cors = CORS(app, resources={r"/api/*": {"origins": "0.0.0.0"}})
 app.url_map.strict_slashes = False
 app.register_blueprint(app_views)
 
+# endpoints whose GET responses are cached -> classes their body is
+# made of, None standing for every class
+cached = {
+    "app_views.stats": (None,),
+    "app_views.get_states": ("State",),
+    "app_views.get_amenities": ("Amenity",),
+    "app_views.get_place_amenities": ("Place", "Amenity"),
+    "app_views.search": ("Place", "Review"),
+    "app_views.get_locations": ("State", "City", "Place"),
+}
+cache = ResponseCache(int(getenv("HBNB_API_CACHE_SIZE", 8 * 1024 * 1024)))
+# seconds after which an ETag, and the body cached under it, expire even
+# though the versions did not change, as with writes made to the
+# database without a DBStorage; 0 never expires them
+cache_ttl = int(getenv("HBNB_API_CACHE_TTL", 60))
+# response headers cached with the bodies
+cached_headers = ("X-Next-Cursor",)
+# tells apart the ETags of this process from those of earlier ones
+epoch = uuid4().hex[:8]
+
+
+@app.before_request
+def serve_cached():
+    """
+    Answers a GET of a cached endpoint with a 304 when the client has
+    its current ETag, or with the body cached under that ETag
+    """
+    classes = cached.get(request.endpoint)
+    if request.method != "GET" or classes is None or g.get("batch"):
+        return None
+    etag = "-".join([epoch] + [str(storage.version(cls)) for cls in classes])
+    if request.endpoint == "app_views.stats" and stats_ttl:
+        # counts reused for stats_ttl may predate the versions: the tag
+        # changes with the period so none is served for much longer
+        etag += "-{:d}".format(int(time.monotonic() // stats_ttl))
+    if cache_ttl:
+        etag += "-{:d}".format(int(time.monotonic() // cache_ttl))
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+    else:
+        entry = cache.get(request.full_path, etag)
+        if entry is None:
+            g.etag = etag
+            return None
+        body, headers = entry
+        resp = make_response(body, 200, list(headers))
+        resp.mimetype = "application/json"
+    resp.set_etag(etag)
+    return resp
+
+
+@app.after_request
+def store_cached(response):
+    """
+    Tags the response of a cached endpoint with its ETag and caches its
+    body as it is sent
+    """
+    etag = g.pop("etag", None)
+    if etag is None or response.status_code != 200:
+        return response
+    response.set_etag(etag)
+    url = request.full_path
+    headers = [(name, response.headers[name]) for name in cached_headers
+               if name in response.headers]
+    chunks = response.iter_encoded()
+
+    def tee():
+        """Yields the body, keeping it for the cache while it fits"""
+        body = []
+        size = 0
+        for chunk in chunks:
+            if body is not None:
+                body.append(chunk)
+                size += len(chunk)
+                if size > cache.max_bytes:
+                    body = None
+            yield chunk
+        if body is not None:
+            cache.put(url, etag, b"".join(body), headers)
+    response.response = tee()
+    return response
+
 
 @app.teardown_appcontext
 def tear(self):
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+"""
+Contains class ResponseCache
+"""
+from collections import OrderedDict
+import threading
+
+
+class ResponseCache:
+    """Least recently used cache of encoded response bodies by URL, each
+    kept with its ETag and headers, holding at most max_bytes of bodies"""
+
+    def __init__(self, max_bytes):
+        """Initialization of an empty cache"""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, url, etag):
+        """Returns the (body, headers) pair cached for url under etag,
+        or None"""
+        with self.__lock:
+            entry = self.__entries.get(url)
+            if entry is None or entry[0] != etag:
+                return None
+            self.__entries.move_to_end(url)
+            return entry[1:]
+
+    def put(self, url, etag, body, headers=()):
+        """Caches body and headers for url under etag, evicting the least
+        recently used bodies beyond max_bytes"""
+        if len(body) > self.max_bytes:
+            return
+        with self.__lock:
+            old = self.__entries.pop(url, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.__entries[url] = (etag, body, tuple(headers))
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                url, (etag, body, headers) = self.__entries.popitem(
+                    last=False)
+                self.size -= len(body)
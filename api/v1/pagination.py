@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Pagination and streaming of the list endpoints
+A page is requested with the limit and cursor query arguments; when more
+objects follow it, its response carries the cursor of the next page in
+the X-Next-Cursor header. Pages are ordered on (created_at, id), or on
+(value, created_at, id) when ordered on a number attribute first.
+Lists are streamed as JSON arrays encoded one object at a time
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from flask import Response, abort, request, stream_with_context
+import json
+from models.base_model import utc
+
+
+def encode_cursor(obj, order=None):
+    """Returns the cursor of the page that follows obj, ordered on the
+    number attribute order first if given, descending if it is -<name>"""
+    position = [obj.created_at.isoformat(), obj.id]
+    if order is not None:
+        value = float(getattr(obj, order.lstrip("-")))
+        position.insert(0, -value if order.startswith("-") else value)
+    return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor, order=None):
+    """Returns the (created_at, id) pair a cursor points after, preceded
+    by the value of the number attribute order if given"""
+    try:
+        position = json.loads(urlsafe_b64decode(cursor.encode()))
+        value = ()
+        if order is not None:
+            value = (float(position.pop(0)),)
+        created_at, id = position
+        return value + (utc(created_at), str(id))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        abort(400, description="Invalid cursor")
+
+
+def stream(objs):
+    """Returns the response streaming the JSON array of the objects of
+    the iterable objs"""
+    def encode():
+        """Yields the array one object at a time"""
+        yield "["
+        separator = ""
+        for obj in objs:
+            yield separator + obj.to_json()
+            separator = ", "
+        yield "]\n"
+    return Response(stream_with_context(encode()),
+                    mimetype="application/json")
+
+
+def paginate(fetch, order=None):
+    """Returns the response streaming the objects fetch(limit, after)
+    iterates over for the page requested, or all of them if none is,
+    ordered on the number attribute order first if given"""
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            abort(400, description="Invalid limit")
+        limit = int(limit)
+    after = decode_cursor(cursor, order) if cursor else None
+    objs = fetch(None if limit is None else limit + 1, after)
+    if limit is None:
+        return stream(objs)
+    objs = list(objs)
+    resp = stream(objs[:limit])
+    if len(objs) > limit:
+        resp.headers["X-Next-Cursor"] = encode_cursor(
+            objs[limit - 1], order)
+    return resp
@@ -4,18 +4,20 @@ Amenity view module for handling all default RESTful API actions
 """
 
 from flask import jsonify, request, abort, make_response
-from models import storage
+from models import storage, storage_t
 from models.amenity import Amenity
+from models.place import Place
 from api.v1.views import app_views
+from api.v1.pagination import paginate
 
 
 @app_views.route('/amenities', methods=['GET'], strict_slashes=False)
 def get_amenities():
     """
     Retrieves the list of all Amenity objects: GET /api/v1/amenities
+    Paged by the limit and cursor query arguments
     """
-    return jsonify([amenity.to_dict() for amenity in
-                    storage.all(Amenity).values()])
+    return paginate(lambda limit, after: storage.page(Amenity, limit, after))
 
 
 @app_views.route('/amenities/<amenity_id>', methods=['GET'],
@@ -36,14 +38,25 @@ def get_amenity(amenity_id):
 def delete_amenity(amenity_id):
     """
     Deletes an Amenity object: DELETE /api/v1/amenities/<amenity_id>
+    The places linking it lose it, and their amenity_count with it
     If the amenity_id is not linked to any Amenity object, raise a 404 error
     Returns an empty dictionary with the status code 200
     """
     amenity = storage.get(Amenity, amenity_id)
     if not amenity:
         abort(404)
-    storage.delete(amenity)
-    storage.save()
+    if storage_t == "db":
+        places = list(amenity.place_amenities)
+    else:
+        places = [place for place in storage.all(Place).values()
+                  if amenity.id in place.amenity_ids]
+    with storage.transaction():
+        for place in places:
+            place.amenities = [other for other in place.amenities
+                               if other.id != amenity.id]
+            place.amenity_count = len(place.amenities)
+        storage.delete(amenity)
+        storage.save()
     return make_response(jsonify({}), 200)
 
 
@@ -63,6 +76,9 @@ def create_amenity():
         abort(400, description="Missing name")
 
     data = request.get_json()
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     new_amenity = Amenity(**data)
     storage.new(new_amenity)
     storage.save()
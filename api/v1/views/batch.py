@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""
+Batch view module running many API requests in a single one
+"""
+from flask import abort, current_app, g, jsonify, make_response, request
+from models import storage
+from api.v1.views import app_views
+import json
+
+
+class Rollback(Exception):
+    """Raised to undo the changes of a failed sub-request"""
+
+
+def run(item):
+    """Returns the status and the JSON body a sub-request gets"""
+    path = "/api/v1" + item["path"]
+    method = str(item.get("method", "GET")).upper()
+    with current_app.test_request_context(path, method=method,
+                                          json=item.get("body")):
+        try:
+            resp = current_app.full_dispatch_request()
+            data = resp.get_data(as_text=True)
+        except Exception:
+            return {"status": 500, "body": {"error": "Internal error"}}
+    try:
+        body = json.loads(data) if data else None
+    except ValueError:
+        body = data
+    return {"status": resp.status_code, "body": body}
+
+
+@app_views.route('/batch', methods=['POST'], strict_slashes=False)
+def batch():
+    """
+    Runs many requests: POST /api/v1/batch
+    The JSON body lists under "requests" the sub-requests, each a
+    dictionary with a path under /api/v1, a method (GET by default) and
+    a JSON body; they run in one storage transaction, undone as a whole
+    if one of them fails, unless "atomic" is false, in which case each
+    runs in its own transaction
+    If the HTTP body request is not a valid batch, raise a 400 error
+    Returns the status code and body of each sub-request with the status
+    code 200, or 400 if an atomic batch failed
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Not a JSON")
+    items = data.get("requests")
+    if (not isinstance(items, list) or
+            not all(isinstance(item, dict) and
+                    isinstance(item.get("path"), str) and
+                    item["path"].startswith("/") and
+                    not item["path"].startswith("/batch")
+                    for item in items)):
+        abort(400, description="Not a batch")
+    atomic = data.get("atomic", True) is not False
+
+    # sub-requests may see changes not committed yet: keep them out of
+    # the response cache
+    g.batch = True
+    responses = []
+    if atomic:
+        try:
+            with storage.transaction():
+                for item in items:
+                    responses.append(run(item))
+                    if responses[-1]["status"] >= 400:
+                        raise Rollback
+        except Rollback:
+            return make_response(jsonify(error="Batch failed",
+                                         responses=responses), 400)
+    else:
+        for item in items:
+            try:
+                with storage.transaction():
+                    responses.append(run(item))
+                    if responses[-1]["status"] >= 400:
+                        raise Rollback
+            except Rollback:
+                pass
+    return make_response(jsonify(responses=responses), 200)
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""
+Batch view module creating and deleting many objects of a resource at once
+"""
+from flask import jsonify, request, abort, make_response
+from models import storage
+from models.amenity import Amenity
+from models.city import City
+from models.place import Place, aggregates
+from models.review import Review
+from models.state import State
+from models.user import User
+from api.v1.views import app_views
+from api.v1.views.places_reviews import count_review, uncount_review
+
+# resource -> class, keys required to create one, classes of its parents
+resources = {
+    "states": (State, ("name",), {}),
+    "cities": (City, ("state_id", "name"), {"state_id": State}),
+    "amenities": (Amenity, ("name",), {}),
+    "users": (User, ("email", "password"), {}),
+    "places": (Place, ("city_id", "user_id", "name"),
+               {"city_id": City, "user_id": User}),
+    "reviews": (Review, ("place_id", "user_id", "text"),
+                {"place_id": Place, "user_id": User}),
+}
+
+
+@app_views.route('/<resource>/batch', methods=['POST'], strict_slashes=False)
+def batch_resource(resource):
+    """
+    Creates and deletes objects of a resource: POST /api/v1/<resource>/batch
+    The JSON body holds the list of dictionaries of the objects to create
+    under "create" and the list of ids of the objects to delete under
+    "delete"; both are stored in a single write
+    If the resource is unknown or a parent object does not exist,
+    raise a 404 error
+    If a dictionary misses a required key,
+    raise a 400 error with the message Missing <key>
+    Returns the new objects and the number of deleted ones
+    with the status code 200
+    """
+    if resource not in resources:
+        abort(404)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Not a JSON")
+    cls, required, parents = resources[resource]
+    create = data.get("create", [])
+    delete = data.get("delete", [])
+    if (not isinstance(create, list) or not isinstance(delete, list) or
+            not all(isinstance(item, dict) for item in create)):
+        abort(400, description="Not a batch")
+    # each id once, in order, so a review listed twice is uncounted once
+    delete = list(dict.fromkeys(map(str, delete)))
+    for item in create:
+        for key in required:
+            if key not in item:
+                abort(400, description="Missing {}".format(key))
+    for key, parent in parents.items():
+        for parent_id in {str(item[key]) for item in create}:
+            if storage.get(parent, parent_id) is None:
+                abort(404)
+
+    for item in create:
+        # the timestamps are set by the storage, not by the clients
+        item.pop("created_at", None)
+        item.pop("updated_at", None)
+    if cls is Place:
+        # the aggregates are kept by the storage, not set by the clients,
+        # and amenities are linked through /places/<place_id>/amenities
+        for item in create:
+            for key in list(aggregates) + ["amenity_ids"]:
+                item.pop(key, None)
+    if cls is User:
+        # a __class__ would mark the password as already hashed
+        for item in create:
+            item.pop("__class__", None)
+    objs = [cls(**item) for item in create]
+    # the reviews deleted, to take out of the aggregates of their places
+    gone = []
+    if cls is Review:
+        gone = [review for review in
+                (storage.get(Review, id) for id in delete) if review]
+    with storage.transaction():
+        if objs:
+            storage.bulk_new(objs)
+        deleted = storage.bulk_delete(cls, delete) if delete else 0
+        if cls is Review:
+            for review in objs:
+                count_review(storage.get(Place, review.place_id), review)
+            for review in gone:
+                place = storage.get(Place, review.place_id)
+                if place:
+                    uncount_review(place, review)
+            storage.save()
+    return make_response(jsonify(created=[obj.to_dict() for obj in objs],
+                                 deleted=deleted), 200)
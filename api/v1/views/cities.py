@@ -8,6 +8,7 @@ from models import storage
 from models.city import City
 from models.state import State
 from api.v1.views import app_views
+from api.v1.pagination import paginate
 
 
 @app_views.route('/states/<state_id>/cities', methods=['GET'],
@@ -18,11 +19,13 @@ def get_cities(state_id):
     GET /api/v1/states/<state_id>/cities
     If the state_id is not linked to any State object,
     raise a 404 error
+    Paged by the limit and cursor query arguments
     """
     state = storage.get(State, state_id)
     if not state:
         abort(404)
-    return jsonify([city.to_dict() for city in state.cities])
+    return paginate(lambda limit, after: storage.page(
+        City, limit, after, state_id=state.id))
 
 
 @app_views.route('/cities/<city_id>', methods=['GET'], strict_slashes=False)
@@ -74,6 +77,9 @@ def create_city(state_id):
         abort(400, description="Missing name")
 
     data = request.get_json()
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     new_city = City(state_id=state_id, **data)
     storage.new(new_city)
     storage.save()
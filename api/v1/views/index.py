@@ -5,8 +5,10 @@ Defines routes for status and object counts
 """
 
 from api.v1.views import app_views
-from flask import jsonify
-from models import storage
+from flask import abort, jsonify
+from models import storage, storage_t
+from os import getenv
+import time
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -14,6 +16,11 @@ from models.city import City
 from models.amenity import Amenity
 from models.review import Review
 
+# seconds /stats answers from the same counts, 0 to count every time
+stats_ttl = float(getenv("HBNB_API_STATS_TTL", 0))
+# [monotonic time, data] of the last counts /stats answered
+last_stats = [0.0, None]
+
 
 @app_views.route("/status", methods=['GET'], strict_slashes=False)
 def status():
@@ -37,16 +44,32 @@ def stats():
     Route to retrieve the number of each object type
     Returns a JSON response with the count of each object type
     """
-    data = {
-        "amenities": storage.count("Amenity"),
-        "cities": storage.count("City"),
-        "places": storage.count("Place"),
-        "reviews": storage.count("Review"),
-        "states": storage.count("State"),
-        "users": storage.count("User"),
-    }
+    now = time.monotonic()
+    data = last_stats[1]
+    if data is None or now - last_stats[0] >= stats_ttl:
+        counts = storage.counts()
+        data = {
+            "amenities": counts["Amenity"],
+            "cities": counts["City"],
+            "places": counts["Place"],
+            "reviews": counts["Review"],
+            "states": counts["State"],
+            "users": counts["User"],
+        }
+        last_stats[:] = [now, data]
 
     resp = jsonify(data)
     resp.status_code = 200
 
     return resp
+
+
+@app_views.route("/pool", methods=['GET'], strict_slashes=False)
+def pool():
+    """
+    Route to retrieve the usage of the database connection pool
+    Returns a JSON response with the pool counters, 404 with file storage
+    """
+    if storage_t != "db":
+        abort(404)
+    return jsonify(storage.pool_status())
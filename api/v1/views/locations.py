@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+"""
+Locations view module for the tree of states, cities and places
+"""
+
+from flask import jsonify
+from models import storage
+from api.v1.views import app_views
+
+
+@app_views.route('/locations', methods=['GET'], strict_slashes=False)
+def get_locations():
+    """
+    Retrieves the location tree: GET /api/v1/locations
+    Returns the states sorted by name with their cities sorted by name,
+    each with its number of places
+    """
+    return jsonify(storage.locations())
@@ -3,9 +3,16 @@
 This module handles all default RESTFul API actions for Place objects.
 """
 from api.v1.views import (app_views, Place, City, User, storage)
+from models.place import aggregates
+from api.v1.pagination import paginate
 from flask import (abort, jsonify, make_response, request)
 import os
 
+# sort -> number attribute the places are ordered on before created_at,
+# descending if it is -<name>
+sorts = {'created_at': None, 'price': 'price_by_night',
+         'review_count': '-review_count', 'amenity_count': '-amenity_count'}
+
 
 @app_views.route('/cities/<city_id>/places', methods=['GET'],
                  strict_slashes=False)
@@ -14,12 +21,13 @@ def view_places_in_city(city_id):
     Returns a list of all places in a city
     Retrieves all places within a city
     A list of dictionaries of place object
+    Paged by the limit and cursor query arguments
     """
     city = storage.get(City, city_id)
     if city is None:
         abort(404)
-    result = [place.to_dict() for place in city.places]
-    return jsonify(result)
+    return paginate(lambda limit, after: storage.page(
+        Place, limit, after, city_id=city.id))
 
 
 @app_views.route('/places/<place_id>', methods=['GET'], strict_slashes=False)
@@ -77,6 +85,13 @@ def create_place(city_id):
         return jsonify(error="Missing name"), 400
 
     data['city_id'] = city_id
+    # amenities are linked through /places/<place_id>/amenities, which
+    # keeps amenity_count
+    for key in list(aggregates) + ['amenity_ids']:
+        data.pop(key, None)
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     place = Place(**data)
     place.save()
     return jsonify(place.to_dict()), 201
@@ -100,6 +115,8 @@ def update_place(place_id):
     data = request.get_json()
 
     ignore_keys = {'id', 'user_id', 'city_id', 'created_at', 'updated_at'}
+    ignore_keys.update(aggregates)
+    ignore_keys.add('amenity_ids')
     for key, value in data.items():
         if key not in ignore_keys:
             setattr(place, key, value)
@@ -108,31 +125,66 @@ def update_place(place_id):
     return jsonify(place.to_dict()), 200
 
 
+def numbers(data, name, keys):
+    """
+    Returns the tuple of the numbers under keys of the dictionary under
+    name in data, None if there is none
+    If it is not such a dictionary, raise a 400 error
+    """
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        return tuple(float(value[key]) for key in keys)
+    except (KeyError, TypeError, ValueError):
+        abort(400, description="Invalid {}".format(name))
+
+
+def number(data, name):
+    """
+    Returns the number under name in data, None if there is none
+    If it is not a number, raise a 400 error
+    """
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        abort(400, description="Invalid {}".format(name))
+
+
 @app_views.route('/places_search', methods=['POST'], strict_slashes=False)
 def list_places():
     """
     List all places of a JSON body
     All places of a JSON body
     Objects matching the search criteria
+    near: {lat, lng, radius_km} keeps the places within radius_km
+    bbox: {min_lat, min_lng, max_lat, max_lng} keeps the places inside
+    price_min, price_max, guests_min and rooms_min bound price_by_night,
+    max_guest and number_rooms
+    sort: created_at (default), price (cheapest first), review_count or
+    amenity_count (most first); places have no rating to sort on
+    Paged by the limit and cursor query arguments
     """
-    if not request.is_json:
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict):
         return jsonify(error="Not a JSON"), 400
 
-    data = request.get_json()
-
-    places = storage.all(Place).values()
-
-    if 'states' in data:
-        states = [storage.get("State", state_id) for state_id in data['states']]
-        cities = [city for state in states for city in state.cities] if states else []
-        places = [place for place in places if place.city_id in [city.id for city in cities]]
-
-    if 'cities' in data:
-        cities = [storage.get(City, city_id) for city_id in data['cities']]
-        places = [place for place in places if place.city_id in [city.id for city in cities]]
-
-    if 'amenities' in data:
-        amenities = data['amenities']
-        places = [place for place in places if all(amenity in [amen.id for amen in place.amenities] for amenity in amenities)]
-
-    return jsonify([place.to_dict() for place in places])
+    near = numbers(data, 'near', ('lat', 'lng', 'radius_km'))
+    bbox = numbers(data, 'bbox', ('min_lat', 'min_lng', 'max_lat', 'max_lng'))
+    ranges = {'price_by_night': (number(data, 'price_min'),
+                                 number(data, 'price_max')),
+              'max_guest': (number(data, 'guests_min'), None),
+              'number_rooms': (number(data, 'rooms_min'), None)}
+    ranges = {k: v for k, v in ranges.items() if v != (None, None)}
+    sort = data.get('sort', 'created_at')
+    if sort not in sorts:
+        abort(400, description="Unsupported sort")
+    order = sorts[sort]
+
+    return paginate(lambda limit, after: storage.search_places(
+        data.get('states'), data.get('cities'), data.get('amenities'),
+        limit, after, near=near, bbox=bbox, ranges=ranges, order=order),
+        order)
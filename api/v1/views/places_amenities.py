@@ -7,14 +7,15 @@ from models import storage
 from models.place import Place
 from models.amenity import Amenity
 from api.v1.views import app_views
+from api.v1.pagination import stream
 
 @app_views.route('/places/<place_id>/amenities', methods=['GET'], strict_slashes=False)
 def get_place_amenities(place_id):
     """Retrieves the list of all Amenity objects of a Place"""
-    place = storage.get(Place, place_id)
+    place = storage.get(Place, place_id, load=("amenities",))
     if not place:
         abort(404)
-    return jsonify([amenity.to_dict() for amenity in place.amenities])
+    return stream(place.amenities)
 
 @app_views.route('/places/<place_id>/amenities/<amenity_id>', methods=['DELETE'], strict_slashes=False)
 def delete_place_amenity(place_id, amenity_id):
@@ -30,8 +31,11 @@ def delete_place_amenity(place_id, amenity_id):
     if amenity not in place.amenities:
         abort(404)
 
-    place.amenities.remove(amenity)
-    storage.save()
+    with storage.transaction():
+        place.amenities = [other for other in place.amenities
+                           if other.id != amenity.id]
+        place.amenity_count = max((place.amenity_count or 0) - 1, 0)
+        storage.save()
     return jsonify({}), 200
 
 @app_views.route('/places/<place_id>/amenities/<amenity_id>', methods=['POST'], strict_slashes=False)
@@ -48,6 +52,8 @@ def link_place_amenity(place_id, amenity_id):
     if amenity in place.amenities:
         return jsonify(amenity.to_dict()), 200
 
-    place.amenities.append(amenity)
-    storage.save()
+    with storage.transaction():
+        place.amenities = place.amenities + [amenity]
+        place.amenity_count = (place.amenity_count or 0) + 1
+        storage.save()
     return jsonify(amenity.to_dict()), 201
@@ -3,6 +3,7 @@
 This module handles all default RESTful API actions for Review object
 """
 from api.v1.views import app_views
+from api.v1.pagination import paginate
 from flask import abort, jsonify, request
 from models import storage
 from models.review import Review
@@ -10,14 +11,34 @@ from models.place import Place
 from models.user import User
 
 
+def count_review(place, review):
+    """Adds a new review to the aggregates of its place"""
+    place.review_count = (place.review_count or 0) + 1
+    if (place.last_review_at is None or
+            review.created_at > place.last_review_at):
+        place.last_review_at = review.created_at
+
+
+def uncount_review(place, review):
+    """Removes a deleted review from the aggregates of its place"""
+    place.review_count = max((place.review_count or 0) - 1, 0)
+    if (place.last_review_at is None or
+            review.created_at >= place.last_review_at):
+        dates = [other.created_at
+                 for other in storage.find(Review, place_id=place.id)
+                 if other.id != review.id]
+        place.last_review_at = max(dates, default=None)
+
+
 @app_views.route('/places/<place_id>/reviews', methods=['GET'], strict_slashes=False)
 def get_reviews(place_id):
-    """Retrieves the list of all Review objects of a Place"""
+    """Retrieves the list of all Review objects of a Place
+    Paged by the limit and cursor query arguments"""
     place = storage.get(Place, place_id)
     if not place:
         abort(404)
-    reviews = [review.to_dict() for review in place.reviews]
-    return jsonify(reviews)
+    return paginate(lambda limit, after: storage.page(
+        Review, limit, after, place_id=place.id))
 
 
 @app_views.route('/reviews/<review_id>', methods=['GET'], strict_slashes=False)
@@ -35,8 +56,12 @@ def delete_review(review_id):
     review = storage.get(Review, review_id)
     if not review:
         abort(404)
-    storage.delete(review)
-    storage.save()
+    place = storage.get(Place, review.place_id)
+    with storage.transaction():
+        storage.delete(review)
+        if place:
+            uncount_review(place, review)
+        storage.save()
     return jsonify({}), 200
 
 
@@ -59,8 +84,14 @@ def create_review(place_id):
         abort(404)
 
     data['place_id'] = place_id
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     review = Review(**data)
-    review.save()
+    with storage.transaction():
+        review.save()
+        count_review(place, review)
+        storage.save()
     return jsonify(review.to_dict()), 201
 
 
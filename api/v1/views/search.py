@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+"""
+Search view module for the full-text search of places and reviews
+"""
+
+from flask import jsonify, request, abort
+from models import storage
+from api.v1.views import app_views
+
+# results returned by default, and at most
+default_limit = 20
+max_limit = 100
+
+
+@app_views.route('/search', methods=['GET'], strict_slashes=False)
+def search():
+    """
+    Searches the places and reviews: GET /api/v1/search?q=<words>
+    Returns the objects whose name, description or text has the words
+    of q, best first, each with its BM25 score
+    limit: number of results, 20 by default and 100 at most
+    type: Place or Review to search only those
+    """
+    q = request.args.get('q', '')
+    if not q.strip():
+        abort(400, description="Missing q")
+    limit = request.args.get('limit', str(default_limit))
+    if not limit.isdigit() or not 1 <= int(limit) <= max_limit:
+        abort(400, description="Invalid limit")
+    cls = request.args.get('type')
+    if cls not in (None, 'Place', 'Review'):
+        abort(400, description="Invalid type")
+    results = storage.search(q, int(limit), cls)
+    return jsonify([{"score": score, "object": obj.to_dict()}
+                    for score, obj in results])
@@ -7,15 +7,16 @@ from flask import jsonify, request, abort, make_response
 from models import storage
 from models.state import State
 from api.v1.views import app_views
+from api.v1.pagination import paginate
 
 
 @app_views.route('/states', methods=['GET'], strict_slashes=False)
 def get_states():
     """
     Retrieves the list of all State objects: GET /api/v1/states
+    Paged by the limit and cursor query arguments
     """
-    states = storage.all(State).values()
-    return jsonify([state.to_dict() for state in states])
+    return paginate(lambda limit, after: storage.page(State, limit, after))
 
 
 @app_views.route('/states/<state_id>', methods=['GET'], strict_slashes=False)
@@ -62,6 +63,9 @@ def create_state():
         abort(400, description="Missing name")
 
     data = request.get_json()
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     new_state = State(**data)
     storage.new(new_state)
     storage.save()
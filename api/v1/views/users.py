@@ -3,6 +3,7 @@
 This module defines the RESTful API actions for User objects.
 """
 from api.v1.views import app_views
+from api.v1.pagination import paginate
 from flask import jsonify, request, abort, make_response
 from models import storage
 from models.user import User
@@ -12,10 +13,9 @@ from models.user import User
 def get_users():
     """
     Retrieves the list of all User objects.
+    Paged by the limit and cursor query arguments
     """
-    all_users = storage.all(User).values()
-    users_list = [user.to_dict() for user in all_users]
-    return jsonify(users_list)
+    return paginate(lambda limit, after: storage.page(User, limit, after))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -55,6 +55,11 @@ def create_user():
         abort(400, description="Missing password")
 
     data = request.get_json()
+    # a __class__ would mark the password as already hashed
+    data.pop('__class__', None)
+    # the timestamps are set by the storage, not by the clients
+    data.pop('created_at', None)
+    data.pop('updated_at', None)
     new_user = User(**data)
     storage.new(new_user)
     storage.save()
@@ -113,7 +113,7 @@ class HBNBCommand(cmd.Cmd):
         if key not in storage.all():
             print("** no instance found **")
             return
-        del storage.all()[key]
+        storage.delete(storage.all()[key])
         storage.save()
 
     def do_all(self, arg):
@@ -123,10 +123,7 @@ class HBNBCommand(cmd.Cmd):
         if arg and arg not in globals():
             print("** class doesn't exist **")
             return
-        instances = storage.all()
-        if arg:
-            instances = {key: val for key, val in instances.items()
-                         if key.startswith(arg)}
+        instances = storage.all(arg) if arg else storage.all()
         print([str(obj) for obj in instances.values()])
 
     def do_update(self, arg):
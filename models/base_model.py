@@ -3,65 +3,160 @@
 Contains class BaseModel
 """
 
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import json
 import models
 from os import getenv
 import sqlalchemy
+import sys
 from sqlalchemy import Column, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
+import threading
 import uuid
 
-time = "%Y-%m-%dT%H:%M:%S.%f"
-
 if models.storage_t == "db":
     Base = declarative_base()
 else:
     Base = object
 
+# compact in-memory layout of the file storage models, see BaseModel
+compact = models.storage_t != "db" and getenv("HBNB_COMPACT_MODELS") == "1"
+epoch = datetime(1970, 1, 1)
+microsecond = timedelta(microseconds=1)
+# serialized forms of the memo_size file storage instances serialized
+# last, dropped on any update
+memo_size = int(getenv("HBNB_MEMO_SIZE", 10000))
+cache = OrderedDict()
+cache_lock = threading.Lock()
+
+
+def utc(value):
+    """Returns the datetime value, or that of the ISO 8601 string value,
+    as a naive UTC datetime like those of datetime.utcnow()"""
+    if type(value) is str:
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 
 class BaseModel:
-    """The BaseModel class from which future classes will be derived"""
+    """The BaseModel class from which future classes will be derived
+    In compact mode (HBNB_COMPACT_MODELS=1, file storage only) the id is
+    interned and kept in a slot with the timestamps, which are stored as
+    integer microseconds; other attributes stay in __dict__"""
     if models.storage_t == "db":
         id = Column(String(60), primary_key=True)
-        created_at = Column(DateTime, default=datetime.utcnow)
+        # with the primary key, the index of the pages' (created_at, id)
+        created_at = Column(DateTime, default=datetime.utcnow, index=True)
         updated_at = Column(DateTime, default=datetime.utcnow)
+    elif compact:
+        __slots__ = ("__dict__", "__weakref__",
+                     "_id", "_created_at", "_updated_at")
+
+        @property
+        def id(self):
+            """the id of the instance"""
+            return self._id
+
+        @id.setter
+        def id(self, value):
+            """interns the id of the instance"""
+            self._id = sys.intern(value)
+
+        @property
+        def created_at(self):
+            """the creation datetime of the instance"""
+            return epoch + self._created_at * microsecond
+
+        @created_at.setter
+        def created_at(self, value):
+            """stores the creation datetime as microseconds"""
+            self._created_at = (utc(value) - epoch) // microsecond
+
+        @property
+        def updated_at(self):
+            """the last update datetime of the instance"""
+            return epoch + self._updated_at * microsecond
+
+        @updated_at.setter
+        def updated_at(self, value):
+            """stores the last update datetime as microseconds"""
+            self._updated_at = (utc(value) - epoch) // microsecond
 
     def __init__(self, *args, **kwargs):
-        """Initialization of the base model"""
+        """Initialization of the base model
+        In file storage the new instance is not stored yet, so its
+        attributes are set without telling the storage"""
+        assign = setattr if models.storage_t == "db" else BaseModel.__assign
         if kwargs:
             for key, value in kwargs.items():
                 if key != "__class__":
-                    setattr(self, key, value)
-            if kwargs.get("created_at", None) and type(self.created_at) is str:
-                self.created_at = datetime.strptime(kwargs["created_at"], time)
+                    assign(self, key, value)
+            if not kwargs.get("created_at", None):
+                assign(self, "created_at", datetime.utcnow())
             else:
-                self.created_at = datetime.utcnow()
-            if kwargs.get("updated_at", None) and type(self.updated_at) is str:
-                self.updated_at = datetime.strptime(kwargs["updated_at"], time)
+                assign(self, "created_at", utc(self.created_at))
+            if not kwargs.get("updated_at", None):
+                assign(self, "updated_at", datetime.utcnow())
             else:
-                self.updated_at = datetime.utcnow()
+                assign(self, "updated_at", utc(self.updated_at))
             if kwargs.get("id", None) is None:
-                self.id = str(uuid.uuid4())
+                assign(self, "id", str(uuid.uuid4()))
         else:
-            self.id = str(uuid.uuid4())
-            self.created_at = datetime.utcnow()
-            self.updated_at = self.created_at
+            assign(self, "id", str(uuid.uuid4()))
+            assign(self, "created_at", datetime.utcnow())
+            assign(self, "updated_at", self.created_at)
+
+    if models.storage_t != "db":
+        def __setattr__(self, name, value):
+            """sets an attribute and tells the storage it changed"""
+            old = self.__dict__.get(name)
+            models.storage.keep(self)
+            self.__assign(name, value)
+            if self in cache:
+                with cache_lock:
+                    cache.pop(self, None)
+            models.storage.touch(self, name, old)
+
+        def __assign(self, name, value):
+            """sets an attribute without telling the storage, as for an
+            instance that is not stored yet"""
+            if compact and type(value) is str and name.endswith("_id"):
+                value = sys.intern(value)
+            super().__setattr__(name, value)
 
     def __str__(self):
         """String representation of the BaseModel class"""
         return "[{:s}] ({:s}) {}".format(self.__class__.__name__, self.id,
-                                         self.__dict__)
+                                         self.__fields())
 
     def save(self):
         """updates the attribute 'updated_at' with the current datetime"""
         self.updated_at = datetime.utcnow()
+        with cache_lock:
+            cache.pop(self, None)
         models.storage.new(self)
         models.storage.save()
 
     def to_dict(self, include_password=False):
-        """returns a dictionary containing all keys/values of the instance"""
+        """returns a dictionary containing all keys/values of the instance
+        In file storage it is memoized until an attribute is set, so
+        mutable attributes must be replaced rather than changed in place"""
+        memo = self.__memo()
+        if memo is not None and include_password in memo:
+            return dict(memo[include_password])
+        dictionary = self._build_dict(include_password)
+        if memo is not None:
+            memo[include_password] = dict(dictionary)
+        return dictionary
+
+    def _build_dict(self, include_password=False):
+        """returns the dictionary of to_dict() without memoizing it, as the
+        storage engines serialize every instance"""
         dictionary = {}
-        dictionary.update(self.__dict__)
+        dictionary.update(self.__fields())
         dictionary.update({'__class__': self.__class__.__name__})
         dictionary['created_at'] = self.created_at.isoformat()
         dictionary['updated_at'] = self.updated_at.isoformat()
@@ -71,6 +166,41 @@ class BaseModel:
             del dictionary['_sa_instance_state']
         return dictionary
 
+    def to_json(self, include_password=False):
+        """returns the JSON text of to_dict(), memoized like it"""
+        memo = self.__memo()
+        if memo is None:
+            return json.dumps(self.to_dict(include_password))
+        key = ("json", include_password)
+        if key not in memo:
+            memo[key] = json.dumps(self.to_dict(include_password))
+        return memo[key]
+
     def delete(self):
         """delete the current instance from the storage"""
         models.storage.delete(self)
+
+    def __memo(self):
+        """returns the memo of the serialized forms of the instance, or
+        None in db storage where updates are not tracked"""
+        if models.storage_t == "db":
+            return None
+        with cache_lock:
+            memo = cache.get(self)
+            if memo is None:
+                memo = cache[self] = {}
+                if len(cache) > memo_size:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(self)
+        return memo
+
+    def __fields(self):
+        """returns the attributes of the instance, including the slots
+        of compact mode"""
+        if not compact:
+            return self.__dict__
+        fields = {"id": self.id, "created_at": self.created_at,
+                  "updated_at": self.updated_at}
+        fields.update(self.__dict__)
+        return fields
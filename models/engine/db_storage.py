@@ -2,25 +2,60 @@
 """
 Database storage engine
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import (Column, Integer, MetaData, String, Table, and_,
+                        create_engine, func, insert, inspect, literal, or_,
+                        select, text, union_all, update)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import scoped_session, selectinload, sessionmaker
+from sqlalchemy.schema import CreateColumn
 from models.base_model import Base
+from models.engine import fulltext, geo
 from models.user import User
 from models.place import Place
 from models.city import City
 from models.amenity import Amenity
 from models.review import Review
 from models.state import State
+from contextlib import contextmanager
+from datetime import timedelta
+import itertools
+import math
 import os
+import threading
 
-classes = {"BaseModel": BaseModel, "User": User, "Place": Place,
-           "City": City, "Amenity": Amenity, "Review": Review, "State": State}
+classes = {"User": User, "Place": Place, "City": City,
+           "Amenity": Amenity, "Review": Review, "State": State}
+# how long before the latest updated_at it read the full-text index reads
+# rows again, for those committed late or stamped by a clock behind
+fulltext_slack = timedelta(minutes=5)
+# the version of each class, bumped by the transaction of every save that
+# changes its objects, whichever process makes it; see version()
+metadata = MetaData()
+class_versions = Table(
+    "class_versions", metadata,
+    Column("name", String(60), primary_key=True),
+    Column("version", Integer, nullable=False, server_default="0"))
 
 
 class DBStorage:
-    """Database storage engine for MySQL storage"""
+    """Database storage engine for MySQL storage
+    Each thread works in its own session, which close() ends"""
     __engine = None
+    # scoped_session - the session of the current thread
     __session = None
+    # FullTextIndex - the words of the places and reviews, built when
+    # first searched, kept up to date by the saves of this process and
+    # refreshed from the rows others updated, see search()
+    __fulltext = None
+    # tuple - the versions of Place and Review the index was refreshed
+    # at, and the latest updated_at it read
+    __fulltext_since = None
+    # Lock - guards __fulltext, which the threads share
+    __fulltext_lock = threading.Lock()
+    # tuple - the versions of the states, cities and places read from
+    # class_versions, and the location tree built from them; see
+    # locations()
+    __tree = None
 
     def __init__(self):
         """Instantiate a DBStorage object"""
@@ -29,17 +64,28 @@ class DBStorage:
         host = os.getenv('HBNB_MYSQL_HOST')
         db = os.getenv('HBNB_MYSQL_DB')
         env = os.getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.format(user, passwd, host, db), pool_pre_ping=True)
+        self.__engine = create_engine(
+            'mysql+mysqldb://{}:{}@{}/{}'.format(user, passwd, host, db),
+            pool_pre_ping=True,
+            pool_size=int(os.getenv('HBNB_MYSQL_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('HBNB_MYSQL_MAX_OVERFLOW', 10)),
+            pool_recycle=int(os.getenv('HBNB_MYSQL_POOL_RECYCLE', 3600)),
+            pool_timeout=float(os.getenv('HBNB_MYSQL_POOL_TIMEOUT', 30)))
 
         if env == "test":
             Base.metadata.drop_all(self.__engine)
+            metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
+    def all(self, cls=None, load=None):
         """Query on the current database session all objects
-        depending on the class name"""
+        depending on the class name
+        load lists the relationships of cls to load along, see __options"""
         new_dict = {}
+        if isinstance(cls, str):
+            cls = classes[cls]
         if cls:
-            for obj in self.__session.query(cls).all():
+            query = self.__session.query(cls)
+            for obj in query.options(*self.__options(cls, load)).all():
                 key = "{}.{}".format(type(obj).__name__, obj.id)
                 new_dict[key] = obj
         else:
@@ -49,22 +95,425 @@ class DBStorage:
                     new_dict[key] = obj
         return new_dict
 
+    def get(self, cls, id, load=None):
+        """Returns the object of class cls (a class or a class name)
+        with the given id, or None if there is none
+        load lists the relationships of cls to load along, see __options"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+            if cls is None:
+                return None
+        return self.__session.get(cls, id,
+                                  options=self.__options(cls, load))
+
+    def count(self, cls=None):
+        """Returns the number of objects of class cls (a class or a
+        class name), or of all objects if cls is None"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        if cls is None:
+            return sum(self.count(clss) for clss in classes.values())
+        return self.__session.query(func.count(cls.id)).scalar()
+
+    def counts(self):
+        """Returns the number of objects of each class by class name,
+        counted in a single query"""
+        query = union_all(*[select(literal(name), func.count(cls.id))
+                            for name, cls in classes.items()])
+        return dict(self.__session.execute(query).all())
+
+    def find(self, cls, **kwargs):
+        """Returns the list of objects of class cls whose attributes
+        match kwargs"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        return self.__session.query(cls).filter_by(**kwargs).all()
+
+    def page(self, cls, limit=None, after=None, **kwargs):
+        """Iterates over up to limit objects of class cls (a class or a
+        class name) that match kwargs, ordered on (created_at, id) and
+        starting after the (created_at, id) pair after"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        query = self.__session.query(cls).filter_by(**kwargs)
+        return self.__page(query, [cls.created_at, cls.id], limit, after)
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      limit=None, after=None, near=None, bbox=None,
+                      ranges=None, order=None):
+        """Returns the places that are in a city of one of the states,
+        in one of the cities and that have all the amenities (lists of
+        ids); None skips a filter
+        near (latitude, longitude, kilometers) and bbox (min_lat, min_lng,
+        max_lat, max_lng) keep the places in range: the boxes around them
+        use the latitude and longitude index, then the distance is checked
+        ranges maps number attributes to (low, high) bounds, either None
+        when open
+        The places are iterated over like page() does, or ordered on the
+        number attribute order first (descending if it is -<name>),
+        after the position after"""
+        query = self.__session.query(Place)
+        if states is not None:
+            query = query.join(City, Place.city_id == City.id).filter(
+                City.state_id.in_(states))
+        if cities is not None:
+            query = query.filter(Place.city_id.in_(cities))
+        for amenity_id in amenities or ():
+            query = query.filter(Place.amenities.any(Amenity.id == amenity_id))
+        if bbox is not None:
+            query = query.filter(self.__within(geo.boxes(*bbox)))
+        if near is not None:
+            lat, lng, radius = near
+            query = query.filter(self.__within(geo.around(lat, lng, radius)))
+            # the haversine of the distance, compared to that of radius
+            a = (func.power(func.sin(func.radians(Place.latitude - lat) / 2),
+                            2) +
+                 math.cos(math.radians(lat)) *
+                 func.cos(func.radians(Place.latitude)) *
+                 func.power(func.sin(func.radians(Place.longitude - lng) / 2),
+                            2))
+            query = query.filter(
+                a <= math.sin(min(radius / geo.R, math.pi) / 2) ** 2)
+        for attr, (low, high) in (ranges or {}).items():
+            column = getattr(Place, attr)
+            if low is not None:
+                query = query.filter(column >= low)
+            if high is not None:
+                query = query.filter(column <= high)
+        columns = [Place.created_at, Place.id]
+        if order is not None:
+            column = getattr(Place, order.lstrip("-"))
+            columns.insert(0, -column if order.startswith("-") else column)
+        return self.__page(query, columns, limit, after)
+
+    def __within(self, boxes):
+        """Returns the condition of a place lying in one of the boxes"""
+        return or_(*[and_(Place.latitude.between(box[0], box[2]),
+                          Place.longitude.between(box[1], box[3]))
+                     for box in boxes])
+
+    def __options(self, cls, load):
+        """Returns the options loading with the objects of class cls the
+        relationship paths of load, such as ("cities", "places.reviews"),
+        in one query per relationship instead of one per object"""
+        options = []
+        for path in load or ():
+            option = None
+            owner = cls
+            for name in path.split("."):
+                attr = getattr(owner, name)
+                if option is None:
+                    option = selectinload(attr)
+                else:
+                    option = option.selectinload(attr)
+                owner = attr.property.mapper.class_
+            options.append(option)
+        return options
+
+    def __page(self, query, columns, limit, after):
+        """Runs query as a keyset page ordered on columns, fetching the
+        rows in batches as they are iterated over"""
+        if after is not None:
+            query = query.filter(self.__after(columns, after))
+        query = query.order_by(*columns)
+        if limit is not None:
+            query = query.limit(limit)
+        return iter(query.yield_per(1000))
+
+    def __after(self, columns, values):
+        """Returns the condition of the columns coming after the values
+        in the order of the columns"""
+        if len(columns) == 1:
+            return columns[0] > values[0]
+        return or_(columns[0] > values[0],
+                   and_(columns[0] == values[0],
+                        self.__after(columns[1:], values[1:])))
+
+    def locations(self):
+        """Returns the states sorted by name, each a dictionary of its id,
+        name, cities and number of places, and its cities sorted by name,
+        each a dictionary of its id, name and number of places
+        The tree is built in three queries and kept until the versions of
+        the states, cities or places change, which the saves of every
+        process bump"""
+        versions = tuple(self.version(cls)
+                         for cls in ("State", "City", "Place"))
+        if self.__tree is None or self.__tree[0] != versions:
+            counts = dict(self.__session.query(
+                Place.city_id, func.count(Place.id)).group_by(Place.city_id))
+            cities = {}
+            for id, name, state_id in self.__session.query(
+                    City.id, City.name, City.state_id).order_by(City.name,
+                                                                City.id):
+                cities.setdefault(state_id, []).append(
+                    (id, name, counts.get(id, 0)))
+            states = [(id, name, tuple(cities.get(id, ())))
+                      for id, name in self.__session.query(
+                          State.id, State.name).order_by(State.name,
+                                                         State.id)]
+            DBStorage.__tree = (versions, states)
+        tree = []
+        for state_id, state_name, branch in self.__tree[1]:
+            branch = [{"id": id, "name": name, "places": places}
+                      for id, name, places in branch]
+            tree.append({"id": state_id, "name": state_name,
+                         "cities": branch,
+                         "places": sum(city["places"] for city in branch)})
+        return tree
+
+    def search(self, query, limit=None, cls=None):
+        """Returns the (score, object) pairs of the places and reviews,
+        or of class cls only (a class or a class name), whose indexed
+        text has words of query, best first
+        The index is held by this process: once the versions of Place or
+        Review change, the rows updated since it last read them, give or
+        take fulltext_slack, are indexed again; the rows other processes
+        deleted are dropped from it when a search finds them missing"""
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        while True:
+            with self.__fulltext_lock:
+                self.__refresh()
+                pairs = self.__fulltext.search(query, limit, cls)
+            ids = {}
+            for score, key in pairs:
+                name, id = key.split(".", 1)
+                ids.setdefault(name, []).append(id)
+            objs = {}
+            for name, in_class in ids.items():
+                model = classes[name]
+                for obj in self.__session.query(model).filter(
+                        model.id.in_(in_class)):
+                    objs["{}.{}".format(name, obj.id)] = obj
+            missing = [key for score, key in pairs if key not in objs]
+            if not missing:
+                return [(score, objs[key]) for score, key in pairs]
+            with self.__fulltext_lock:
+                for key in missing:
+                    self.__fulltext.remove(key)
+
+    def __refresh(self):
+        """Indexes the places and reviews updated since the index last
+        read them, all of them at first, if their versions changed"""
+        versions = (self.version("Place"), self.version("Review"))
+        index = self.__fulltext
+        since = None
+        if index is None:
+            # built aside, so that a failing scan leaves no index behind
+            index = fulltext.FullTextIndex()
+        elif self.__fulltext_since[0] == versions:
+            return
+        else:
+            since = self.__fulltext_since[1]
+        latest = since
+        for name, attrs in fulltext.fields.items():
+            model = classes[name]
+            rows = self.__session.query(
+                model.id, model.updated_at,
+                *[getattr(model, attr) for attr in attrs])
+            if since is not None:
+                rows = rows.filter(
+                    model.updated_at >= since - fulltext_slack)
+            texts = {}
+            for id, updated_at, *words in rows.yield_per(1000):
+                texts["{}.{}".format(name, id)] = "\n".join(
+                    text or "" for text in words)
+                if updated_at and (latest is None or updated_at > latest):
+                    latest = updated_at
+            index.update(texts)
+        DBStorage.__fulltext = index
+        DBStorage.__fulltext_since = (versions, latest)
+
+    def version(self, cls=None):
+        """Returns a number that changes whenever an object of class cls
+        (a class or a class name), or any object if None, is added,
+        changed or deleted through a DBStorage, in any process
+        It is read from the database in the transaction of the session,
+        so it matches what the session reads next"""
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        if cls is None:
+            query = select(func.sum(class_versions.c.version))
+        else:
+            query = select(class_versions.c.version).where(
+                class_versions.c.name == cls)
+        return self.__session.execute(query).scalar() or 0
+
     def new(self, obj):
         """Add the object to the current database session"""
         self.__session.add(obj)
 
     def save(self):
-        """Commit all changes of the current database session"""
-        self.__session.commit()
+        """Commit all changes of the current database session, or only
+        flush them to the database in a transaction"""
+        session = self.__session()
+        changed = session.info.setdefault("changed", set())
+        changed.update(type(obj).__name__
+                       for objs in (session.new, session.dirty,
+                                    session.deleted)
+                       for obj in objs)
+        for obj in itertools.chain(session.new, session.dirty):
+            if type(obj).__name__ in fulltext.fields:
+                self.__document(type(obj), obj.id, fulltext.document(obj))
+        for obj in session.deleted:
+            self.__document(type(obj), obj.id, None)
+        if session.info.get("transaction"):
+            session.flush()
+            return
+        if changed:
+            session.execute(update(class_versions).where(
+                class_versions.c.name.in_(changed)).values(
+                    version=class_versions.c.version + 1))
+        session.commit()
+        changed.clear()
+        documents = session.info.pop("documents", {})
+        with self.__fulltext_lock:
+            if self.__fulltext is not None:
+                for key, text in documents.items():
+                    if text is None:
+                        self.__fulltext.remove(key)
+                    else:
+                        self.__fulltext.add(key, text)
+
+    @contextmanager
+    def transaction(self):
+        """Runs the with block as a transaction of the current session:
+        its saves are committed together at its end, or rolled back if
+        it raises"""
+        session = self.__session()
+        if session.info.get("transaction"):
+            yield
+            return
+        session.info["transaction"] = True
+        try:
+            yield
+        except BaseException:
+            session.rollback()
+            session.info.get("changed", set()).clear()
+            session.info.pop("documents", None)
+            raise
+        finally:
+            session.info.pop("transaction", None)
+        self.save()
 
     def delete(self, obj=None):
         """Delete from the current database session obj if not None"""
         if obj:
             self.__session.delete(obj)
 
+    def bulk_new(self, objs):
+        """Inserts the objects of objs with one executemany per class and
+        saves; the objects are not added to the session"""
+        rows = {}
+        for obj in objs:
+            cls = type(obj)
+            rows.setdefault(cls, []).append(
+                {attr.key: getattr(obj, attr.key)
+                 for attr in inspect(cls).column_attrs})
+            if cls.__name__ in fulltext.fields:
+                self.__document(cls, obj.id, fulltext.document(obj))
+        for cls, mappings in rows.items():
+            self.__session.execute(insert(cls), mappings)
+        self.__changed(*rows)
+        self.save()
+
+    def bulk_delete(self, cls, ids):
+        """Deletes the objects of class cls (a class or a class name)
+        with the given ids in one statement, saves and returns the
+        number of objects deleted"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        ids = list(ids)
+        count = self.__session.query(cls).filter(cls.id.in_(ids)).delete()
+        for id in ids:
+            self.__document(cls, id, None)
+        self.__changed(cls)
+        self.save()
+        return count
+
+    def __changed(self, *classes):
+        """Records that the objects of classes changed outside the unit of
+        work of the session, so that save() bumps their versions"""
+        self.__session().info.setdefault("changed", set()).update(
+            cls.__name__ for cls in classes)
+
+    def __document(self, cls, id, text):
+        """Records the text of the object of class cls with that id, None
+        once deleted, for save() to give to the full-text index"""
+        if cls.__name__ in fulltext.fields:
+            self.__session().info.setdefault("documents", {})[
+                "{}.{}".format(cls.__name__, id)] = text
+
     def reload(self):
         """Reload all tables in the database"""
         Base.metadata.create_all(self.__engine)
-        session_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session_factory)
-        self.__session = Session()
+        metadata.create_all(self.__engine)
+        self.__migrate()
+        if self.__session is not None:
+            self.__session.remove()
+        session_factory = sessionmaker(bind=self.__engine,
+                                       expire_on_commit=False)
+        self.__session = scoped_session(session_factory)
+
+    def __migrate(self):
+        """Upgrades the tables of an existing database, which create_all
+        leaves as they are, by adding the columns and creating the indexes
+        they lack; the aggregates of the places are computed when added
+        The classes lacking a row of class_versions are given one"""
+        inspector = inspect(self.__engine)
+        added = set()
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"]
+                        for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(
+                        dialect=self.__engine.dialect)
+                    with self.__engine.begin() as connection:
+                        connection.execute(text("ALTER TABLE {} ADD {}".format(
+                            table.name, ddl)))
+                    added.add(column)
+            existing = {index["name"]
+                        for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(self.__engine)
+        place_amenity = Base.metadata.tables["place_amenity"]
+        aggregates = {
+            "review_count": select(func.count(Review.id)).where(
+                Review.place_id == Place.id).scalar_subquery(),
+            "amenity_count": select(func.count()).select_from(
+                place_amenity).where(
+                    place_amenity.c.place_id == Place.id).scalar_subquery(),
+            "last_review_at": select(func.max(Review.created_at)).where(
+                Review.place_id == Place.id).scalar_subquery(),
+        }
+        values = {column.name: aggregates[column.name] for column in added
+                  if column.table is Place.__table__ and
+                  column.name in aggregates}
+        if values:
+            with self.__engine.begin() as connection:
+                connection.execute(update(Place).values(**values))
+        try:
+            with self.__engine.begin() as connection:
+                names = set(connection.execute(
+                    select(class_versions.c.name)).scalars())
+                rows = [{"name": name} for name in classes
+                        if name not in names]
+                if rows:
+                    connection.execute(insert(class_versions), rows)
+        except IntegrityError:
+            # another process inserted them first
+            pass
+
+    def close(self):
+        """Ends the session of the current thread, giving its connection
+        back to the pool; the next call starts a new one"""
+        self.__session.remove()
+
+    def pool_status(self):
+        """Returns the usage of the connection pool"""
+        pool = self.__engine.pool
+        return {"size": pool.size(), "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow()}
@@ -1,19 +1,200 @@
 #!/usr/bin/python3
 """
 Serializes and deserializes instances to and from JSON file
+The file format is chosen with HBNB_FILE_FORMAT: json (default), orjson
+or msgpack; existing files are converted to it when reloaded
 """
+import bisect
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+import heapq
+import itertools
 import json
 import models
 from models.base_model import BaseModel
+from models.engine import fulltext, geo
 from models.user import User
 from models.place import Place
 from models.city import City
 from models.amenity import Amenity
 from models.review import Review
 from models.state import State
+from os import getenv
+import os
+import threading
+import time
+from types import MappingProxyType
 
 classes = {"BaseModel": BaseModel, "User": User, "Place": Place,
            "City": City, "Amenity": Amenity, "Review": Review, "State": State}
+foreign_keys = {"City": ("state_id",),
+                "Place": ("city_id", "user_id", "amenity_ids"),
+                "Review": ("place_id", "user_id")}
+
+
+def referenced(value):
+    """Returns the values a foreign key, or a list of them, refers to"""
+    if isinstance(value, list):
+        return value
+    return (value,)
+
+
+def location(obj):
+    """Returns the (latitude, longitude) of a place, or None if it does
+    not have both"""
+    try:
+        return (float(obj.__dict__["latitude"]),
+                float(obj.__dict__["longitude"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def number(value):
+    """Returns value as a number, or None if it is not one"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def numeric(obj, attr):
+    """Returns the attribute attr of obj as a number, or None if it is
+    not one; -<name> stands for the opposite of the attribute name"""
+    if attr.startswith("-"):
+        value = number(getattr(obj, attr[1:], None))
+        return None if value is None else -value
+    return number(getattr(obj, attr, None))
+
+
+def discard(positions, entry):
+    """Removes entry from the sorted list positions if it is there"""
+    i = bisect.bisect_left(positions, entry)
+    if i < len(positions) and positions[i] == entry:
+        del positions[i]
+
+
+def position(obj, order=None):
+    """Returns the (created_at, id) pair the listings are ordered on,
+    preceded by the number attribute order if given, see numeric()"""
+    if order is None:
+        return (obj.created_at, obj.id)
+    return (numeric(obj, order), obj.created_at, obj.id)
+
+
+def ordered(objs, limit=None, after=None, order=None):
+    """Returns up to limit of objs ordered on their position, starting
+    after the position after; objs whose attribute order is not a number
+    are left out. With a limit, only the top limit are kept while going
+    through objs rather than sorting them all"""
+    if order is not None:
+        objs = [obj for obj in objs if numeric(obj, order) is not None]
+    key = partial(position, order=order)
+    if after is not None:
+        objs = [obj for obj in objs if key(obj) > after]
+    if limit is None:
+        return sorted(objs, key=key)
+    return heapq.nsmallest(limit, objs, key=key)
+
+
+class JSONSerializer:
+    """Writes snapshots as a JSON object with one record per line,
+    and the journal as one JSON record per line"""
+    binary = False
+
+    def __init__(self, dumps, loads):
+        """dumps and loads convert between objects and JSON bytes"""
+        self.dumps = dumps
+        self.loads = loads
+
+    def write_snapshot(self, f, items, count):
+        """Writes the count (key, record) pairs of items to f"""
+        f.write(b"{")
+        sep = b"\n"
+        for key, value in items:
+            f.write(sep + self.dumps(key) + b": " + self.dumps(value))
+            sep = b",\n"
+        f.write(b"\n}\n")
+
+    def read_snapshot(self, f):
+        """Yields the (key, record, bytes read) of the snapshot in f, a
+        line at a time, or all at once for a single-line snapshot"""
+        first = f.readline()
+        if first.strip() != b"{":
+            data = first + f.read()
+            for key, value in self.loads(data).items():
+                yield key, value, len(data)
+            return
+        done = len(first)
+        for line in f:
+            done += len(line)
+            line = line.strip().rstrip(b",")
+            if line == b"}":
+                return
+            if line:
+                key, value = self.loads(b"{" + line + b"}").popitem()
+                yield key, value, done
+        raise ValueError("Truncated snapshot")
+
+    def write_record(self, f, record):
+        """Appends record to the journal open in f"""
+        f.write(self.dumps(record) + b"\n")
+
+    def read_records(self, f):
+        """Yields the records of the journal in f, up to a torn write"""
+        for line in f:
+            try:
+                yield self.loads(line)
+            except ValueError:
+                return
+
+
+class MsgpackSerializer:
+    """Writes snapshots as a msgpack map, and the journal as a
+    sequence of msgpack records"""
+    binary = True
+
+    def __init__(self):
+        """Imports msgpack, which is an optional dependency"""
+        import msgpack
+        self.msgpack = msgpack
+
+    def write_snapshot(self, f, items, count):
+        """Writes the count (key, record) pairs of items to f"""
+        packer = self.msgpack.Packer()
+        f.write(packer.pack_map_header(count))
+        for key, value in items:
+            f.write(packer.pack(key))
+            f.write(packer.pack(value))
+
+    def read_snapshot(self, f):
+        """Yields the (key, record, bytes read) of the snapshot in f"""
+        unpacker = self.msgpack.Unpacker(f, raw=False)
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            yield key, unpacker.unpack(), unpacker.tell()
+
+    def write_record(self, f, record):
+        """Appends record to the journal open in f"""
+        f.write(self.msgpack.packb(record))
+
+    def read_records(self, f):
+        """Yields the records of the journal in f, up to a torn write"""
+        yield from self.msgpack.Unpacker(f, raw=False)
+
+
+def serializer(name):
+    """Returns the serializer of the file format called name"""
+    if name == "orjson":
+        import orjson
+        return JSONSerializer(orjson.dumps, orjson.loads)
+    if name == "msgpack":
+        return MsgpackSerializer()
+    if name != "json":
+        raise ValueError("Unknown file format: {}".format(name))
+    return JSONSerializer(lambda obj: json.dumps(obj).encode(), json.loads)
 
 
 class FileStorage:
@@ -23,38 +204,834 @@ class FileStorage:
     __file_path = "file.json"
     # dictionary - empty but will store all objects by <class name>.id
     __objects = {}
+    # bool - append changes to a journal instead of rewriting __file_path
+    __journal = getenv("HBNB_FILE_JOURNAL") == "1"
+    # int - journal records after which the journal is folded back
+    __journal_limit = int(getenv("HBNB_FILE_JOURNAL_LIMIT", 1000))
+    # int - records currently in the journal
+    __journal_size = 0
+    # set - objects modified since the last save
+    __dirty = set()
+    # set - keys deleted since the last save
+    __deleted = set()
+    # dictionary - <class name> -> the objects of that class by key
+    __buckets = {}
+    # dictionary - (<class name>, <foreign key>) -> value -> keys
+    __references = {}
+    # dictionary - <class name> -> sorted positions, built when first paged
+    __orders = {}
+    # dictionary - number attribute -> sorted positions of the places on
+    # it, built when first searched on that attribute
+    __ranks = {}
+    # dictionary - <class name>, or None for any -> version, see version()
+    __versions = {}
+    # iterator - source of the versions
+    __clock = itertools.count(1)
+    # Grid - the places by location, built when first searched that way
+    __grid = None
+    # tuple - the (name, id) of the states, sorted, and a dictionary
+    # state id -> the (name, id) of its cities, sorted; see locations()
+    __tree = None
+    # FullTextIndex - the words of the places and reviews, built when
+    # first searched and written next to __file_path with full snapshots
+    __fulltext = None
+    # dictionary - key -> record before the running transaction changed
+    # it, None if it did not exist; None outside transactions
+    __undo = None
+    # int - identifier of the thread running the transaction
+    __owner = None
+    # dictionary - the __objects the buckets and references were built from
+    __indexed = None
+    # bool - keep reloaded records as dictionaries until first accessed
+    __lazy = getenv("HBNB_FILE_LAZY") == "1"
+    # dictionary - <class name> -> records not built yet by <class name>.id
+    __raw = {}
+    # serializer - format __file_path and its journal are written in
+    __serializer = serializer(getenv("HBNB_FILE_FORMAT", "json"))
+    # condition - guards the objects, the indexes and the commits
+    __lock = threading.Condition(threading.RLock())
+    # float - seconds a commit waits for more saves to join it
+    __commit_window = float(getenv("HBNB_FILE_COMMIT_WINDOW", 0)) / 1000
+    # int - saves requested so far
+    __requested = 0
+    # int - saves whose changes are on disk
+    __committed = 0
+    # bool - whether a thread is writing a commit
+    __committing = False
+    # bool - whether the next commit must write a full snapshot
+    __compacting = False
 
-    def all(self, cls=None):
-        """Returns the dictionary __objects"""
+    def all(self, cls=None, load=None):
+        """Returns the dictionary __objects, or a read-only view of the
+        objects of class cls (a class or a class name)
+        load is there for DBStorage, relationships are always at hand"""
         if cls:
-            (return {k: v for k, v in self.__objects.items()
-             if isinstance(v, cls)})
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            self.__materialize(cls)
+            self.__index()
+            return MappingProxyType(self.__buckets.setdefault(cls, {}))
+        self.__materialize()
         return self.__objects
 
+    def get(self, cls, id, load=None):
+        """Returns the object of class cls (a class or a class name)
+        with the given id, or None if there is none
+        load is there for DBStorage, relationships are always at hand"""
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        if key in self.__raw.get(cls, {}):
+            with self.__lock:
+                value = self.__raw.get(cls, {}).pop(key, None)
+                if value is not None:
+                    self.__insert(key, classes[cls](**value))
+        return self.__objects.get(key)
+
+    def count(self, cls=None):
+        """Returns the number of objects of class cls (a class or a
+        class name), or of all objects if cls is None"""
+        if cls is None:
+            return len(self.__objects) + sum(map(len, self.__raw.values()))
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        self.__index()
+        return (len(self.__buckets.get(cls, {})) +
+                len(self.__raw.get(cls, {})))
+
+    def counts(self):
+        """Returns the number of objects of each class by class name"""
+        self.__index()
+        return {cls: (len(self.__buckets.get(cls, {})) +
+                      len(self.__raw.get(cls, {}))) for cls in classes}
+
+    def find(self, cls, **kwargs):
+        """Returns the list of objects of class cls whose attributes
+        match kwargs, looked up by reference when a foreign key is given"""
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        self.__materialize(cls)
+        self.__index()
+        with self.__lock:
+            objs = list(self.__buckets.get(cls, {}).values())
+            for attr in foreign_keys.get(cls, ()):
+                if attr in kwargs and not isinstance(kwargs[attr], list):
+                    keys = self.__references.get((cls, attr), {}).get(
+                        kwargs[attr], ())
+                    objs = [self.__objects[key] for key in keys]
+                    break
+        return [obj for obj in objs
+                if all(getattr(obj, k, None) == v for k, v in kwargs.items())]
+
+    def page(self, cls, limit=None, after=None, **kwargs):
+        """Iterates over up to limit objects of class cls (a class or a
+        class name) that match kwargs, ordered on (created_at, id) and
+        starting after the (created_at, id) pair after"""
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        if kwargs:
+            return iter(ordered(self.find(cls, **kwargs), limit, after))
+        return self.__walk(cls, limit, after)
+
+    def __walk(self, cls, limit, after, chunk=1000):
+        """Yields the objects of page(), looking up chunk positions at a
+        time so that neither a copy of the order nor the lock is held"""
+        self.__materialize(cls)
+        while limit is None or limit > 0:
+            size = chunk if limit is None else min(chunk, limit)
+            with self.__lock:
+                self.__index()
+                order = self.__orders.get(cls)
+                if order is None:
+                    order = sorted(map(position,
+                                       self.__buckets.get(cls, {}).values()))
+                    self.__orders[cls] = order
+                start = 0 if after is None else bisect.bisect_right(order,
+                                                                    after)
+                positions = order[start:start + size]
+                objs = [self.__objects["{}.{}".format(cls, id)]
+                        for created_at, id in positions]
+            yield from objs
+            if len(positions) < size:
+                return
+            after = positions[-1]
+            if limit is not None:
+                limit -= size
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      limit=None, after=None, near=None, bbox=None,
+                      ranges=None, order=None):
+        """Returns the places that are in a city of one of the states,
+        in one of the cities and that have all the amenities (lists of
+        ids), intersecting the references; None skips a filter
+        near (latitude, longitude, kilometers) and bbox (min_lat, min_lng,
+        max_lat, max_lng) keep the places in range, found in a grid
+        ranges maps number attributes to (low, high) bounds, either None
+        when open, looked up in sorted indexes of the places
+        The places are iterated over like page() does, or ordered on the
+        number attribute order first (descending if it is -<name>),
+        after the position after"""
+        self.__materialize("City")
+        self.__materialize("Place")
+        with self.__lock:
+            self.__index()
+            refs = self.__references
+            in_city = refs.get(("Place", "city_id"), {})
+            keys = None
+            if states is not None:
+                in_state = refs.get(("City", "state_id"), {})
+                keys = set()
+                for state_id in states:
+                    for city in in_state.get(state_id, ()):
+                        keys.update(in_city.get(city.split(".", 1)[1], ()))
+            if cities is not None:
+                found = set()
+                for city_id in cities:
+                    found.update(in_city.get(city_id, ()))
+                keys = found if keys is None else keys & found
+            with_amenity = refs.get(("Place", "amenity_ids"), {})
+            for found in sorted((with_amenity.get(amenity_id, set())
+                                 for amenity_id in amenities or ()),
+                                key=len):
+                keys = found if keys is None else keys & found
+            if near is not None or bbox is not None:
+                found = self.__located(near, bbox)
+                keys = found if keys is None else keys & found
+            for attr, (low, high) in (ranges or {}).items():
+                found = self.__ranged(attr, low, high)
+                keys = found if keys is None else keys & found
+            if keys is None and order is None:
+                return self.page("Place", limit, after)
+            if order is not None:
+                rank = self.__rank(order)
+                # walk the order unless few places match
+                if keys is None or len(keys) * 32 >= len(rank):
+                    start = 0 if after is None else bisect.bisect_right(
+                        rank, after)
+                    found = ("Place." + id for value, created_at, id in
+                             itertools.islice(rank, start, None))
+                    if keys is not None:
+                        found = (key for key in found if key in keys)
+                    return iter([self.__objects[key]
+                                 for key in itertools.islice(found, limit)])
+            return iter(ordered([self.__objects[key] for key in keys],
+                                limit, after, order))
+
+    def locations(self):
+        """Returns the states sorted by name, each a dictionary of its id,
+        name, cities and number of places, and its cities sorted by name,
+        each a dictionary of its id, name and number of places
+        The sorted states and cities are kept as they change, and the
+        numbers of places read from the references"""
+        for name in ("State", "City", "Place"):
+            self.__materialize(name)
+        with self.__lock:
+            self.__index()
+            if self.__tree is None:
+                FileStorage.__tree = ([], {})
+                for name in ("State", "City"):
+                    for obj in self.__buckets.get(name, {}).values():
+                        branch, entry = self.__branch(obj)
+                        branch.append(entry)
+                self.__tree[0].sort()
+                for branch in self.__tree[1].values():
+                    branch.sort()
+            states, cities = self.__tree
+            in_city = self.__references.get(("Place", "city_id"), {})
+            tree = []
+            for state_name, state_id in states:
+                branch = [{"id": id,
+                           "name": self.__objects["City." + id].name,
+                           "places": len(in_city.get(id, ()))}
+                          for name, id in cities.get(state_id, ())]
+                tree.append({"id": state_id,
+                             "name": self.__objects["State." + state_id].name,
+                             "cities": branch,
+                             "places": sum(city["places"] for city in branch)})
+            return tree
+
+    def search(self, query, limit=None, cls=None):
+        """Returns the (score, object) pairs of the places and reviews,
+        or of class cls only (a class or a class name), whose indexed
+        text has words of query, best first"""
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        for name in fulltext.fields:
+            self.__materialize(name)
+        with self.__lock:
+            self.__index()
+            if self.__fulltext is None:
+                index = fulltext.FullTextIndex()
+                index.load(self.__fulltext_path())
+                index.sync({key: fulltext.document(obj)
+                            for name in fulltext.fields
+                            for key, obj in self.__buckets.get(
+                                name, {}).items()})
+                FileStorage.__fulltext = index
+            return [(score, self.__objects[key]) for score, key
+                    in self.__fulltext.search(query, limit, cls)]
+
+    def version(self, cls=None):
+        """Returns a number that changes whenever an object of class cls
+        (a class or a class name), or any object if None, is added,
+        changed or deleted"""
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        self.__index()
+        return self.__versions.get(cls, 0)
+
     def new(self, obj):
         """Sets in __objects the obj with key <obj class name>.id"""
-        self.__objects["{}.{}".format(type(obj).__name__, obj.id)] = obj
+        key = "{}.{}".format(type(obj).__name__, obj.id)
+        with self.__lock:
+            self.__raw.get(type(obj).__name__, {}).pop(key, None)
+            self.__insert(key, obj)
+            if self.__journal:
+                self.__dirty.add(obj)
+                self.__deleted.discard(key)
+
+    def bulk_new(self, objs):
+        """Adds every object of objs and saves them in a single write"""
+        with self.__lock:
+            for obj in objs:
+                self.new(obj)
+        self.save()
+
+    def bulk_delete(self, cls, ids):
+        """Deletes the objects of class cls (a class or a class name)
+        with the given ids, saves in a single write and returns the
+        number of objects deleted"""
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        count = 0
+        with self.__lock:
+            for id in ids:
+                key = "{}.{}".format(cls, id)
+                if key in self.__objects or key in self.__raw.get(cls, {}):
+                    self.__remove(key)
+                    count += 1
+                    if self.__journal:
+                        self.__deleted.add(key)
+        self.save()
+        return count
+
+    def keep(self, obj):
+        """Remembers obj as it is before a change, in case the running
+        transaction is undone"""
+        if self.__undo is not None:
+            key = "{}.{}".format(type(obj).__name__, getattr(obj, "id", None))
+            if self.__objects.get(key) is obj:
+                self.__remember(key)
+
+    @contextmanager
+    def transaction(self):
+        """Runs the with block as a transaction: the objects it changes
+        are saved once at its end, or put back as they were if it raises
+        Other threads wait to change objects until it ends"""
+        with self.__lock:
+            if self.__undo is not None:
+                yield
+                return
+            FileStorage.__undo = {}
+            FileStorage.__owner = threading.get_ident()
+            try:
+                yield
+            except BaseException:
+                self.__rollback()
+                raise
+            finally:
+                FileStorage.__undo = None
+                FileStorage.__owner = None
+        self.save()
+
+    def touch(self, obj, name=None, old=None):
+        """Flags obj as modified so the next save journals it, and
+        moves it between references when its foreign key name changed
+        Objects that are not stored are left alone"""
+        cls = type(obj).__name__
+        key = "{}.{}".format(cls, getattr(obj, "id", None))
+        with self.__lock:
+            if self.__objects.get(key) is not obj:
+                return
+            if self.__journal:
+                self.__dirty.add(obj)
+            self.__bump(cls)
+            if name == "created_at":
+                self.__orders.pop(cls, None)
+            if cls == "Place" and self.__ranks:
+                self.__rerank(obj, name, old)
+            if (name in ("latitude", "longitude") and
+                    self.__grid is not None and cls == "Place"):
+                self.__locate(key, obj)
+            if (cls in ("State", "City") and name in ("name", "state_id") and
+                    self.__tree is not None):
+                if old is None:
+                    old = getattr(type(obj), name, None)
+                discard(*self.__branch(obj, name, old))
+                bisect.insort(*self.__branch(obj))
+            if (name in fulltext.fields.get(cls, ()) and
+                    self.__fulltext is not None):
+                self.__fulltext.add(key, fulltext.document(obj))
+            if name in foreign_keys.get(cls, ()):
+                self.__index()
+                if self.__objects.get(key) is obj:
+                    for value in referenced(old):
+                        self.__unreference(cls, name, value, key)
+                    for value in referenced(obj.__dict__.get(name)):
+                        self.__reference(cls, name, value, key)
 
     def save(self):
-        """Serializes __objects to the JSON file (path: __file_path)"""
-        with open(self.__file_path, 'w') as f:
-            temp = {k: v.to_dict(include_password=True)
-                    for k, v in self.__objects.items()}
-            json.dump(temp, f)
-
-    def reload(self):
-        """Deserializes the JSON file to __objects"""
+        """Serializes __objects to the JSON file (path: __file_path)
+        In journal mode only the changes since the last save are appended
+        to the journal, which is compacted once it reaches its limit.
+        Saves made while another thread is writing share its next write,
+        saves made in a transaction wait for its end"""
+        if self.__owner == threading.get_ident():
+            return
+        self.__commit()
+
+    def compact(self):
+        """Writes a full snapshot of __objects and empties the journal"""
+        with self.__lock:
+            FileStorage.__compacting = True
+        self.__commit()
+
+    def __commit(self):
+        """Waits until the changes made so far are on disk, writing
+        them if no other thread is already doing it"""
+        lock = self.__lock
+        with lock:
+            FileStorage.__requested += 1
+            ticket = self.__requested
+            while self.__committing and self.__committed < ticket:
+                lock.wait()
+            if self.__committed >= ticket:
+                return
+            FileStorage.__committing = True
+        try:
+            if self.__commit_window:
+                time.sleep(self.__commit_window)
+            ticket = self.__write()
+            with lock:
+                FileStorage.__committed = max(self.__committed, ticket)
+        finally:
+            with lock:
+                FileStorage.__committing = False
+                lock.notify_all()
+
+    def __write(self):
+        """Appends the changes since the last write to the journal, or
+        writes a full snapshot, and returns the last save it covers"""
+        with self.__lock:
+            ticket = self.__requested
+            compact = (self.__compacting or not self.__journal or
+                       not os.path.exists(self.__file_path))
+            if compact:
+                items = self.__items()
+            else:
+                records = self.__records()
+        if not compact:
+            if records:
+                with open(self.__journal_path(), 'ab') as f:
+                    for record in records:
+                        self.__serializer.write_record(f, record)
+                    f.flush()
+                    os.fsync(f.fileno())
+                FileStorage.__journal_size += len(records)
+            if self.__journal_size < self.__journal_limit:
+                return ticket
+            with self.__lock:
+                items = self.__items()
+        with self.__lock:
+            documents = (None if self.__fulltext is None else
+                         self.__fulltext.snapshot())
+        tmp = self.__file_path + ".tmp"
+        with open(tmp, 'wb') as f:
+            self.__serializer.write_snapshot(f, items, len(items))
+            f.flush()
+            os.fsync(f.fileno())
+        # the journal goes first: a complete .tmp left by a crash here
+        # already holds its changes, and reload() puts it in place
+        try:
+            os.remove(self.__journal_path())
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, self.__file_path)
+        FileStorage.__journal_size = 0
+        if documents is not None:
+            fulltext.write(self.__fulltext_path(), documents)
+        return ticket
+
+    def __items(self):
+        """Returns the (key, record) pairs of every object, and forgets
+        the changes pending for the journal"""
+        items = [(k, v._build_dict(include_password=True))
+                 for k, v in self.__objects.items()]
+        for raw in self.__raw.values():
+            items.extend(raw.items())
+        FileStorage.__compacting = False
+        self.__dirty.clear()
+        self.__deleted.clear()
+        return items
+
+    def __records(self):
+        """Returns the journal records of the changes since the last
+        write, and forgets them"""
+        records = [{"key": key, "value": None} for key in self.__deleted]
+        for obj in self.__dirty:
+            key = "{}.{}".format(type(obj).__name__, obj.id)
+            if self.__objects.get(key) is obj:
+                value = obj._build_dict(include_password=True)
+                records.append({"key": key, "value": value})
+        self.__dirty.clear()
+        self.__deleted.clear()
+        return records
+
+    def reload(self, progress=None):
+        """Deserializes the JSON file to __objects, then replays
+        the journal written since that snapshot
+        progress, if given, is called with the number of bytes read and
+        the size of the file every 10000 records and once at the end"""
+        with self.__lock:
+            self.__recover()
+            self.__reload(progress)
+
+    def __reload(self, progress):
+        """Loads the snapshot and the journal, see reload()"""
+        convert = False
+        # places saved before their aggregates were kept
+        stale = []
+        try:
+            with open(self.__file_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                reader = self.__reader(f)
+                convert = reader.binary != self.__serializer.binary
+                count = 0
+                for key, value, done in reader.read_snapshot(f):
+                    self.__load(key, value)
+                    if (value["__class__"] == "Place" and
+                            "review_count" not in value):
+                        stale.append(key)
+                    count += 1
+                    if progress and count % 10000 == 0:
+                        progress(done, size)
+                if progress:
+                    progress(size, size)
+        except FileNotFoundError:
+            pass
+        size = 0
         try:
-            with open(self.__file_path, 'r') as f:
-                temp = json.load(f)
-                for key, value in temp.items():
-                    self.__objects[key] = classes[value["__class__"]](**value)
+            with open(self.__journal_path(), 'rb') as f:
+                for record in self.__reader(f).read_records(f):
+                    if record["value"] is None:
+                        self.__remove(record["key"])
+                    else:
+                        self.__load(record["key"], record["value"])
+                        if (record["value"]["__class__"] == "Place" and
+                                "review_count" not in record["value"]):
+                            stale.append(record["key"])
+                    size += 1
         except FileNotFoundError:
             pass
+        FileStorage.__journal_size = size
+        self.__dirty.clear()
+        self.__deleted.clear()
+        if stale:
+            self.__migrate(stale)
+        if convert:
+            self.compact()
+
+    def close(self):
+        """Ends the use of the storage by a request; __objects stays the
+        live copy of the file, so there is nothing to reload"""
+        pass
 
     def delete(self, obj=None):
         """Delete obj from __objects if it's inside"""
         if obj:
             key = "{}.{}".format(type(obj).__name__, obj.id)
-            if key in self.__objects:
-                del self.__objects[key]
+            with self.__lock:
+                if key in self.__objects:
+                    self.__remove(key)
+                    if self.__journal:
+                        self.__dirty.discard(obj)
+                        self.__deleted.add(key)
+
+    def __migrate(self, keys):
+        """Fills in the aggregates of the places of keys from their
+        reviews and amenities"""
+        self.__materialize("Place")
+        self.__materialize("Review")
+        self.__index()
+        reviews = self.__references.get(("Review", "place_id"), {})
+        for key in keys:
+            place = self.__objects.get(key)
+            if place is None:
+                continue
+            dates = [self.__objects[review].created_at
+                     for review in reviews.get(place.id, ())]
+            place.review_count = len(dates)
+            place.amenity_count = len(place.amenity_ids)
+            place.last_review_at = max(dates, default=None)
+
+    def __recover(self):
+        """Puts in place a snapshot written completely before a crash
+        stopped save() from renaming it, or drops a partial one"""
+        tmp = self.__file_path + ".tmp"
+        try:
+            with open(tmp, 'rb') as f:
+                for record in self.__reader(f).read_snapshot(f):
+                    pass
+        except FileNotFoundError:
+            return
+        except Exception:
+            os.remove(tmp)
+            return
+        try:
+            os.remove(self.__journal_path())
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, self.__file_path)
+
+    def __reader(self, f):
+        """Returns the serializer able to read the file open in f"""
+        head = f.peek(1)[:1]
+        if self.__serializer.binary == (head not in b"{ \t\r\n"):
+            return self.__serializer
+        if head in b"{ \t\r\n":
+            return serializer("json")
+        return serializer("msgpack")
+
+    def __load(self, key, value):
+        """Adds a deserialized record to __objects, or keeps it as it is
+        for later in lazy mode"""
+        cls = value["__class__"]
+        if self.__lazy and key not in self.__objects:
+            self.__raw.setdefault(cls, {})[key] = value
+        else:
+            self.__raw.get(cls, {}).pop(key, None)
+            self.__insert(key, classes[cls](**value))
+
+    def __materialize(self, cls=None):
+        """Builds the instances of class cls (of every class if None)
+        that lazy mode kept as dictionaries"""
+        if not self.__raw:
+            return
+        with self.__lock:
+            for name in [cls] if cls else list(self.__raw):
+                raw = self.__raw.pop(name, None)
+                if raw:
+                    for key, value in raw.items():
+                        self.__insert(key, classes[name](**value))
+
+    def __index(self):
+        """Rebuilds the buckets and references if __objects was
+        replaced since they were built"""
+        if FileStorage.__indexed is not self.__objects:
+            FileStorage.__buckets = {}
+            FileStorage.__references = {}
+            FileStorage.__orders = {}
+            FileStorage.__ranks = {}
+            FileStorage.__grid = None
+            FileStorage.__fulltext = None
+            FileStorage.__tree = None
+            FileStorage.__indexed = self.__objects
+            for key, obj in self.__objects.items():
+                self.__add(key, obj)
+            for cls in classes:
+                self.__bump(cls)
+
+    def __insert(self, key, obj):
+        """Adds obj to __objects, its class bucket and its references"""
+        self.__remember(key)
+        self.__index()
+        old = self.__objects.get(key)
+        if old is not None:
+            self.__discard(key, old)
+        self.__add(key, obj)
+        self.__objects[key] = obj
+        self.__bump(type(obj).__name__)
+
+    def __remove(self, key):
+        """Removes key from __objects, its class bucket and references"""
+        self.__remember(key)
+        self.__raw.get(key.split(".")[0], {}).pop(key, None)
+        self.__index()
+        obj = self.__objects.pop(key, None)
+        if obj is not None:
+            self.__discard(key, obj)
+            self.__bump(type(obj).__name__)
+
+    def __add(self, key, obj):
+        """Adds obj to the bucket of its class and to its references"""
+        cls = type(obj).__name__
+        self.__buckets.setdefault(cls, {})[key] = obj
+        if cls in self.__orders:
+            bisect.insort(self.__orders[cls], position(obj))
+        if cls == "Place" and self.__grid is not None:
+            self.__locate(key, obj)
+        if cls in fulltext.fields and self.__fulltext is not None:
+            self.__fulltext.add(key, fulltext.document(obj))
+        if cls in ("State", "City") and self.__tree is not None:
+            bisect.insort(*self.__branch(obj))
+        if cls == "Place":
+            for attr, rank in self.__ranks.items():
+                if numeric(obj, attr) is not None:
+                    bisect.insort(rank, position(obj, attr))
+        for attr in foreign_keys.get(cls, ()):
+            for value in referenced(obj.__dict__.get(attr)):
+                self.__reference(cls, attr, value, key)
+
+    def __discard(self, key, obj):
+        """Removes obj from the bucket of its class and its references"""
+        cls = type(obj).__name__
+        self.__buckets.get(cls, {}).pop(key, None)
+        if cls in self.__orders:
+            discard(self.__orders[cls], position(obj))
+        if cls == "Place" and self.__grid is not None:
+            self.__grid.remove(key)
+        if cls in fulltext.fields and self.__fulltext is not None:
+            self.__fulltext.remove(key)
+        if cls in ("State", "City") and self.__tree is not None:
+            discard(*self.__branch(obj))
+        if cls == "Place":
+            for attr, rank in self.__ranks.items():
+                discard(rank, position(obj, attr))
+        for attr in foreign_keys.get(cls, ()):
+            for value in referenced(obj.__dict__.get(attr)):
+                self.__unreference(cls, attr, value, key)
+
+    def __branch(self, obj, name=None, value=None):
+        """Returns the sorted list of the location tree that obj, a state
+        or a city, is in and its (name, id) entry there, as they are, or
+        as they were when its attribute name was value"""
+        attrs = {"name": obj.name, "state_id": getattr(obj, "state_id", None)}
+        if name is not None:
+            attrs[name] = value
+        entry = (str(attrs["name"]), obj.id)
+        states, cities = self.__tree
+        if type(obj).__name__ == "State":
+            return states, entry
+        return cities.setdefault(attrs["state_id"], []), entry
+
+    def __located(self, near, bbox):
+        """Returns the set of keys of the places within near, in bbox"""
+        if self.__grid is None:
+            FileStorage.__grid = geo.Grid()
+            for key, obj in self.__buckets.get("Place", {}).items():
+                self.__locate(key, obj)
+        found = None
+        if bbox is not None:
+            found = set()
+            for box in geo.boxes(*bbox):
+                found.update(self.__grid.within(box))
+        if near is not None:
+            close = self.__grid.near(*near)
+            found = close if found is None else found & close
+        return found
+
+    def __rank(self, attr):
+        """Returns the sorted (value, created_at, id) positions of the
+        places whose attribute attr is a number, see numeric()"""
+        rank = self.__ranks.get(attr)
+        if rank is None:
+            rank = sorted(position(obj, attr)
+                          for obj in self.__buckets.get("Place", {}).values()
+                          if numeric(obj, attr) is not None)
+            self.__ranks[attr] = rank
+        return rank
+
+    def __rerank(self, obj, name, old):
+        """Moves the place obj in the ranks on its attribute name, whose
+        value in its __dict__ was old, or drops them all if name is
+        created_at"""
+        if name == "created_at":
+            self.__ranks.clear()
+            return
+        if old is None:
+            old = getattr(type(obj), name, None)
+        for attr, rank in self.__ranks.items():
+            if attr.lstrip("-") != name:
+                continue
+            value = number(old)
+            if value is not None:
+                if attr.startswith("-"):
+                    value = -value
+                discard(rank, (value, obj.created_at, obj.id))
+            if numeric(obj, attr) is not None:
+                bisect.insort(rank, position(obj, attr))
+
+    def __ranged(self, attr, low, high):
+        """Returns the set of keys of the places whose attribute attr is
+        between low and high, either None when open"""
+        rank = self.__rank(attr)
+        start = 0 if low is None else bisect.bisect_left(rank, (low,))
+        stop = (len(rank) if high is None else
+                bisect.bisect_right(rank, (high, datetime.max)))
+        return {"Place." + id for value, created_at, id in rank[start:stop]}
+
+    def __locate(self, key, obj):
+        """Puts the place obj at its location in the grid"""
+        point = location(obj)
+        if point is None:
+            self.__grid.remove(key)
+        else:
+            self.__grid.add(key, *point)
+
+    def __remember(self, key):
+        """Records key as it is before the running transaction changes it,
+        if the change comes from the thread running the transaction"""
+        if (self.__undo is None or key in self.__undo or
+                self.__owner != threading.get_ident()):
+            return
+        obj = self.__objects.get(key)
+        if obj is not None:
+            self.__undo[key] = obj._build_dict(include_password=True)
+        else:
+            self.__undo[key] = self.__raw.get(key.split(".")[0], {}).get(key)
+
+    def __rollback(self):
+        """Puts back the objects the running transaction changed"""
+        undo = self.__undo
+        FileStorage.__undo = None
+        for key, value in undo.items():
+            if value is None:
+                self.__remove(key)
+                if self.__journal:
+                    self.__deleted.add(key)
+            else:
+                obj = classes[value["__class__"]](**value)
+                self.__insert(key, obj)
+                if self.__journal:
+                    self.__dirty.add(obj)
+                    self.__deleted.discard(key)
+
+    def __bump(self, cls):
+        """Gives class cls, and any class, a new version once a change
+        to its objects is visible"""
+        version = next(self.__clock)
+        self.__versions[cls] = version
+        self.__versions[None] = version
+
+    def __reference(self, cls, attr, value, key):
+        """Records that key has value as its foreign key attr"""
+        values = self.__references.setdefault((cls, attr), {})
+        values.setdefault(value, set()).add(key)
+
+    def __unreference(self, cls, attr, value, key):
+        """Forgets that key has value as its foreign key attr"""
+        values = self.__references.get((cls, attr), {})
+        keys = values.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del values[value]
+
+    def __journal_path(self):
+        """Returns the path of the journal kept next to __file_path"""
+        return self.__file_path + ".log"
+
+    def __fulltext_path(self):
+        """Returns the path of the full-text index kept next to
+        __file_path"""
+        return self.__file_path + ".fts"
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+"""
+Full-text search of the storage engines: an inverted index of the words
+of the Place names and descriptions and of the Review texts, scored with
+BM25
+"""
+from collections import Counter
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+import zlib
+
+# class name -> attributes whose words are indexed
+fields = {"Place": ("name", "description"), "Review": ("text",)}
+# BM25 saturation of the word frequencies and normalization of lengths
+k1 = 1.2
+b = 0.75
+words = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Returns the words of text, lowercased and without accents"""
+    text = text.casefold()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text)
+                       if not unicodedata.combining(c))
+    return words.findall(text)
+
+
+def document(obj):
+    """Returns the indexed text of obj"""
+    return "\n".join(str(getattr(obj, attr, None) or "")
+                     for attr in fields[type(obj).__name__])
+
+
+def write(path, documents):
+    """Writes the snapshot() of an index to path, replacing it atomically
+    It is only a cache of the index: sync() checks it on load"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(documents, f)
+    os.replace(tmp, path)
+
+
+def checksum(text):
+    """Returns the checksum telling whether a text was indexed as is"""
+    return zlib.crc32(text.encode())
+
+
+class FullTextIndex:
+    """Inverted index of documents by key, such as Place.<id>"""
+
+    def __init__(self):
+        """Initialization of an empty index"""
+        # dictionary - word -> key -> frequency of the word in the document
+        self.postings = {}
+        # dictionary - key -> (checksum, word -> frequency, length)
+        self.documents = {}
+        # int - sum of the lengths of the documents
+        self.total = 0
+
+    def add(self, key, text):
+        """Indexes text as the document key, replacing any former one"""
+        self.__add(key, checksum(text), Counter(tokenize(text)))
+
+    def __add(self, key, check, counts):
+        """Indexes the word counts of the document key"""
+        self.remove(key)
+        length = sum(counts.values())
+        self.documents[key] = (check, counts, length)
+        self.total += length
+        for word, count in counts.items():
+            self.postings.setdefault(word, {})[key] = count
+
+    def remove(self, key):
+        """Forgets the document key if it is indexed"""
+        entry = self.documents.pop(key, None)
+        if entry is None:
+            return
+        check, counts, length = entry
+        self.total -= length
+        for word in counts:
+            posting = self.postings[word]
+            del posting[key]
+            if not posting:
+                del self.postings[word]
+
+    def update(self, texts):
+        """Indexes the documents of texts, a dictionary key -> text,
+        indexing again only those that changed"""
+        for key, text in texts.items():
+            entry = self.documents.get(key)
+            if entry is None or entry[0] != checksum(text):
+                self.add(key, text)
+
+    def sync(self, texts):
+        """Makes the index hold exactly the documents of texts, a
+        dictionary key -> text, indexing again only those that changed"""
+        for key in [key for key in self.documents if key not in texts]:
+            self.remove(key)
+        self.update(texts)
+
+    def search(self, query, limit=None, cls=None):
+        """Returns the (score, key) pairs of the documents of class cls,
+        or of any class if None, with words of query, best first"""
+        n = len(self.documents)
+        if n == 0:
+            return []
+        average = self.total / n or 1
+        prefix = None if cls is None else cls + "."
+        scores = {}
+        for word in set(tokenize(query)):
+            posting = self.postings.get(word)
+            if posting is None:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, count in posting.items():
+                if prefix is not None and not key.startswith(prefix):
+                    continue
+                length = self.documents[key][2]
+                score = idf * count * (k1 + 1) / (
+                    count + k1 * (1 - b + b * length / average))
+                scores[key] = scores.get(key, 0.0) + score
+        pairs = ((score, key) for key, score in scores.items())
+        if limit is None:
+            return sorted(pairs, reverse=True)
+        return heapq.nlargest(limit, pairs)
+
+    def snapshot(self):
+        """Returns the documents as write() takes them"""
+        return {key: [check, counts]
+                for key, (check, counts, length) in self.documents.items()}
+
+    def load(self, path):
+        """Indexes the documents write() wrote to path, if it exists"""
+        try:
+            with open(path) as f:
+                documents = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for key, (check, counts) in documents.items():
+            self.__add(key, check, counts)
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+Geographic helpers of the storage engines: great-circle distances,
+bounding boxes and a grid index of points
+Boxes are (min_lat, min_lng, max_lat, max_lng) tuples in degrees
+"""
+from math import asin, cos, degrees, floor, radians, sin, sqrt
+
+# mean radius of the Earth in kilometers
+R = 6371.0088
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Returns the distance in kilometers between two points"""
+    a = (sin(radians(lat2 - lat1) / 2) ** 2 +
+         cos(radians(lat1)) * cos(radians(lat2)) *
+         sin(radians(lng2 - lng1) / 2) ** 2)
+    return 2 * R * asin(min(1.0, sqrt(a)))
+
+
+def boxes(min_lat, min_lng, max_lat, max_lng):
+    """Returns the boxes covering a box whose longitudes may go past
+    180 or -180, or whose min_lng is east of its max_lng, that is a box
+    across the antimeridian"""
+    if max_lng < min_lng:
+        max_lng += 360
+    if max_lng - min_lng >= 360:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    if min_lng < -180:
+        return [(min_lat, min_lng + 360, max_lat, 180.0),
+                (min_lat, -180.0, max_lat, max_lng)]
+    if max_lng > 180:
+        return [(min_lat, min_lng, max_lat, 180.0),
+                (min_lat, -180.0, max_lat, max_lng - 360)]
+    return [(min_lat, min_lng, max_lat, max_lng)]
+
+
+def around(lat, lng, radius):
+    """Returns the boxes covering the points within radius kilometers
+    of (lat, lng)"""
+    angle = radius / R
+    min_lat = lat - degrees(angle)
+    max_lat = lat + degrees(angle)
+    if min_lat <= -90 or max_lat >= 90 or sin(angle) >= cos(radians(lat)):
+        return [(max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)]
+    spread = degrees(asin(sin(angle) / cos(radians(lat))))
+    return boxes(min_lat, lng - spread, max_lat, lng + spread)
+
+
+def contains(box, lat, lng):
+    """Tells whether (lat, lng) lies in box"""
+    return box[0] <= lat <= box[2] and box[1] <= lng <= box[3]
+
+
+class Grid:
+    """Index of points by key in square cells of size degrees"""
+
+    def __init__(self, size=0.1):
+        """Initialization of an empty grid"""
+        self.size = size
+        self.cells = {}
+        self.points = {}
+
+    def __cell(self, lat, lng):
+        """Returns the cell of (lat, lng)"""
+        return (floor(lat / self.size), floor(lng / self.size))
+
+    def add(self, key, lat, lng):
+        """Indexes key at (lat, lng), moving it if it was elsewhere"""
+        self.remove(key)
+        self.points[key] = (lat, lng)
+        self.cells.setdefault(self.__cell(lat, lng), set()).add(key)
+
+    def remove(self, key):
+        """Forgets key if it is indexed"""
+        point = self.points.pop(key, None)
+        if point is not None:
+            cell = self.__cell(*point)
+            keys = self.cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+    def within(self, box):
+        """Returns the set of keys of the points in box"""
+        rows = range(floor(box[0] / self.size), floor(box[2] / self.size) + 1)
+        cols = range(floor(box[1] / self.size), floor(box[3] / self.size) + 1)
+        if len(rows) * len(cols) > len(self.cells):
+            cells = [keys for (row, col), keys in self.cells.items()
+                     if row in rows and col in cols]
+        else:
+            cells = [self.cells[(row, col)] for row in rows for col in cols
+                     if (row, col) in self.cells]
+        points = self.points
+        return {key for keys in cells for key in keys
+                if contains(box, *points[key])}
+
+    def near(self, lat, lng, radius):
+        """Returns the set of keys of the points within radius kilometers
+        of (lat, lng)"""
+        points = self.points
+        return {key for box in around(lat, lng, radius)
+                for key in self.within(box)
+                if haversine(lat, lng, *points[key]) <= radius}
@@ -1,10 +1,12 @@
 #!/usr/bin/python
 """ holds class Place"""
+from datetime import datetime
 import models
-from models.base_model import BaseModel, Base
+from models.base_model import BaseModel, Base, utc
 from os import getenv
 import sqlalchemy
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table
+from sqlalchemy import (Column, String, Integer, Float, DateTime, ForeignKey,
+                        Index, Table)
 from sqlalchemy.orm import relationship
 
 if models.storage_t == 'db':
@@ -18,13 +20,26 @@ if models.storage_t == 'db':
                                             ondelete='CASCADE'),
                                  primary_key=True))
 
+# aggregates of the reviews and amenities of a place, kept up to date by
+# the API as they are added and removed -> value of a new place
+aggregates = {"review_count": 0, "amenity_count": 0, "last_review_at": None}
+
 
 class Place(BaseModel, Base):
     """Representation of Place """
     if models.storage_t == 'db':
         __tablename__ = 'places'
+        # also serves the lookups on city_id alone
+        __table_args__ = (Index('ix_places_city_id_price_by_night',
+                                'city_id', 'price_by_night'),
+                          Index('ix_places_latitude_longitude',
+                                'latitude', 'longitude'),
+                          Index('ix_places_price_by_night_created_at',
+                                'price_by_night', 'created_at', 'id'),
+                          Index('ix_places_updated_at', 'updated_at'))
         city_id = Column(String(60), ForeignKey('cities.id'), nullable=False)
-        user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+        user_id = Column(String(60), ForeignKey('users.id'), nullable=False,
+                         index=True)
         name = Column(String(128), nullable=False)
         description = Column(String(1024), nullable=True)
         number_rooms = Column(Integer, nullable=False, default=0)
@@ -33,6 +48,11 @@ class Place(BaseModel, Base):
         price_by_night = Column(Integer, nullable=False, default=0)
         latitude = Column(Float, nullable=True)
         longitude = Column(Float, nullable=True)
+        review_count = Column(Integer, nullable=False, default=0,
+                              server_default="0")
+        amenity_count = Column(Integer, nullable=False, default=0,
+                               server_default="0")
+        last_review_at = Column(DateTime, nullable=True)
         reviews = relationship("Review", backref="place")
         amenities = relationship("Amenity", secondary="place_amenity",
                                  backref="place_amenities",
@@ -49,30 +69,49 @@ class Place(BaseModel, Base):
         latitude = 0.0
         longitude = 0.0
         amenity_ids = []
+        review_count = 0
+        amenity_count = 0
+        last_review_at = None
 
     def __init__(self, *args, **kwargs):
         """initializes Place"""
         super().__init__(*args, **kwargs)
+        if (type(self.last_review_at) is str or
+                getattr(self.last_review_at, "tzinfo", None) is not None):
+            self.last_review_at = utc(self.last_review_at)
+
+    def _build_dict(self, include_password=False):
+        """returns a dictionary containing all keys/values of the instance,
+        aggregates included"""
+        dictionary = super()._build_dict(include_password)
+        for name, value in aggregates.items():
+            if dictionary.get(name) is None:
+                dictionary[name] = value
+        last_review_at = dictionary["last_review_at"]
+        if isinstance(last_review_at, datetime):
+            dictionary["last_review_at"] = last_review_at.isoformat()
+        return dictionary
 
     if models.storage_t != 'db':
         @property
         def reviews(self):
             """getter attribute returns the list of Review instances"""
             from models.review import Review
-            review_list = []
-            all_reviews = models.storage.all(Review)
-            for review in all_reviews.values():
-                if review.place_id == self.id:
-                    review_list.append(review)
-            return review_list
+            return models.storage.find(Review, place_id=self.id)
 
         @property
         def amenities(self):
             """getter attribute returns the list of Amenity instances"""
             from models.amenity import Amenity
-            amenity_list = []
             all_amenities = models.storage.all(Amenity)
-            for amenity in all_amenities.values():
-                if amenity.place_id == self.id:
+            amenity_list = []
+            for amenity_id in self.amenity_ids:
+                amenity = all_amenities.get("Amenity." + amenity_id)
+                if amenity is not None:
                     amenity_list.append(amenity)
             return amenity_list
+
+        @amenities.setter
+        def amenities(self, amenities):
+            """setter attribute keeps the ids of the Amenity instances"""
+            self.amenity_ids = [amenity.id for amenity in amenities]
@@ -1,18 +1,19 @@
 #!/usr/bin/python3
 """ holds class User"""
+from hashlib import md5
 import models
 from models.base_model import BaseModel, Base
 from os import getenv
 import sqlalchemy
 from sqlalchemy import Column, String
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 
 
 class User(BaseModel, Base):
     """Representation of a user """
     if models.storage_t == 'db':
         __tablename__ = 'users'
-        email = Column(String(128), nullable=False)
+        email = Column(String(128), nullable=False, index=True)
         password = Column(String(128), nullable=False)
         first_name = Column(String(128), nullable=True)
         last_name = Column(String(128), nullable=True)
@@ -20,24 +21,50 @@ class User(BaseModel, Base):
         reviews = relationship("Review", backref="user")
     else:
         email = ""
-        password = ""
         first_name = ""
         last_name = ""
 
     def __init__(self, *args, **kwargs):
-        """initializes user"""
+        """initializes user
+        The password of a serialized user, which has a __class__, is
+        already hashed"""
+        password = None
+        if models.storage_t != 'db' and '__class__' in kwargs:
+            password = kwargs.pop('password', None)
         super().__init__(*args, **kwargs)
+        if password is not None:
+            self.__dict__['password'] = password
 
-    @property
-    def password(self):
-        """
-        return passwd
-        """
-        return self._password
+    if models.storage_t != 'db':
+        @property
+        def places(self):
+            """getter attribute returns the list of Place instances"""
+            from models.place import Place
+            return models.storage.find(Place, user_id=self.id)
 
-    @password.setter
-    def password(self, value):
-        """
-        aet passwd
-        """
-        self._password = md5(value.encode()).hexdigest()
+        @property
+        def reviews(self):
+            """getter attribute returns the list of Review instances"""
+            from models.review import Review
+            return models.storage.find(Review, user_id=self.id)
+
+        @property
+        def password(self):
+            """
+            return the md5 hash of the passwd
+            """
+            return self.__dict__.get('password', "")
+
+        @password.setter
+        def password(self, value):
+            """
+            set passwd, keeping its md5 hash
+            """
+            self.__dict__['password'] = md5(value.encode()).hexdigest()
+    else:
+        @validates('password')
+        def __hash_password(self, key, value):
+            """
+            set passwd, keeping its md5 hash
+            """
+            return md5(value.encode()).hexdigest()
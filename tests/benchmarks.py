@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+"""
+Micro-benchmarks for the storage engine and the models
+Usage: python3 -m tests.benchmarks [<number of objects>]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from models.engine.file_storage import FileStorage
+from models.base_model import BaseModel
+from models.state import State
+from models.city import City
+from models.place import Place
+
+
+def timed(label, func, repeat=10):
+    """Prints the best time of repeat runs of func"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<40} {:>12.6f}s".format(label, best))
+
+
+def bench_all_by_class(size):
+    """all(cls) on a store of size objects, 1% of them States"""
+    storage = FileStorage()
+    storage._FileStorage__objects = {}
+    for i in range(size):
+        storage.new(State() if i % 100 == 0 else BaseModel())
+    objects = storage.all()
+    timed("scan all() with isinstance",
+          lambda: {k: v for k, v in objects.items()
+                   if isinstance(v, State)}, 3)
+    timed("all(State)", lambda: storage.all(State))
+    timed("all(State) values", lambda: list(storage.all(State).values()))
+
+
+def bench_reload(size):
+    """reload() of a snapshot of size objects, eager and lazy"""
+    storage = FileStorage()
+    path = FileStorage._FileStorage__file_path
+    FileStorage._FileStorage__file_path = "bench.json"
+    FileStorage._FileStorage__objects = {}
+    for i in range(size):
+        storage.new(BaseModel())
+    storage.save()
+
+    def reload(lazy):
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__raw = {}
+        FileStorage._FileStorage__lazy = lazy
+        storage.reload()
+    timed("reload()", lambda: reload(False), 3)
+    timed("reload() in lazy mode", lambda: reload(True), 3)
+    FileStorage._FileStorage__lazy = False
+    FileStorage._FileStorage__file_path = path
+    os.remove("bench.json")
+
+
+def bench_search_places(size):
+    """places_search on size Places in 1000 cities of 50 states, with
+    the former list scans of the view and with search_places()"""
+    storage = FileStorage()
+    FileStorage._FileStorage__objects = {}
+    states = [State(name=str(i)) for i in range(50)]
+    cities = [City(name=str(i), state_id=states[i % 50].id)
+              for i in range(1000)]
+    for obj in states + cities:
+        storage.new(obj)
+    for i in range(size):
+        storage.new(Place(name=str(i), city_id=cities[i % 1000].id,
+                          amenity_ids=["a{}".format(i % 7),
+                                       "a{}".format(i % 11)]))
+    wanted_states = [s.id for s in states[:5]]
+    wanted_cities = [c.id for c in cities[:20]]
+    amenities = ["a1", "a2"]
+
+    def scan():
+        places = storage.all(Place).values()
+        state_cities = [city for state_id in wanted_states
+                        for city in storage.get(State, state_id).cities]
+        places = [place for place in places
+                  if place.city_id in [city.id for city in state_cities]]
+        places = [place for place in places
+                  if place.city_id in wanted_cities]
+        return [place for place in places
+                if all(a in place.amenity_ids for a in amenities)]
+    timed("places_search with list scans", scan, 1)
+    timed("search_places()",
+          lambda: storage.search_places(wanted_states, wanted_cities,
+                                        amenities))
+
+
+def bench_near(size):
+    """Places within 5 km among size Places spread over the US, with a
+    scan of the distances and with search_places(near=...)"""
+    from models.engine.geo import haversine
+    import random
+    storage = FileStorage()
+    FileStorage._FileStorage__objects = {}
+    rand = random.Random(0)
+    for i in range(size):
+        storage.new(Place(name=str(i), latitude=rand.uniform(25, 49),
+                          longitude=rand.uniform(-124, -67)))
+    places = storage.all(Place).values()
+    timed("near with a scan of the distances",
+          lambda: [p for p in places
+                   if haversine(37.77, -122.42, p.latitude,
+                                p.longitude) <= 5], 3)
+    list(storage.search_places(near=(37.77, -122.42, 5)))
+    timed("search_places(near=...)",
+          lambda: list(storage.search_places(near=(37.77, -122.42, 5))))
+
+
+def bench_price(size):
+    """The 20 cheapest of size Places for 2 guests or more, with a full
+    sort of the matches and with search_places(ranges=..., order=...)"""
+    import random
+    storage = FileStorage()
+    FileStorage._FileStorage__objects = {}
+    rand = random.Random(0)
+    for i in range(size):
+        storage.new(Place(name=str(i), price_by_night=rand.randrange(500),
+                          max_guest=rand.randrange(1, 9)))
+    places = storage.all(Place).values()
+    timed("cheapest with a sort of the matches",
+          lambda: sorted([p for p in places if p.max_guest >= 2],
+                         key=lambda p: p.price_by_night)[:20], 3)
+    search = storage.search_places
+    list(search(ranges={"max_guest": (2, None)}, order="price_by_night"))
+    timed("search_places(ranges=..., order=...)",
+          lambda: list(search(ranges={"max_guest": (2, None)}, limit=20,
+                              order="price_by_night")))
+    timed("search_places(order=...)",
+          lambda: list(search(limit=20, order="price_by_night")))
+
+
+def bench_fulltext(size):
+    """Reviews with a word among size Reviews of 20 random words, with a
+    scan of the texts and with search()"""
+    from models.review import Review
+    import random
+    storage = FileStorage()
+    FileStorage._FileStorage__objects = {}
+    rand = random.Random(0)
+    vocabulary = ["word{}".format(i) for i in range(5000)]
+    for i in range(size):
+        storage.new(Review(text=" ".join(rand.choices(vocabulary, k=20))))
+    reviews = storage.all(Review).values()
+    timed("word with a scan of the texts",
+          lambda: [r for r in reviews if "word42" in r.text.split()], 3)
+    timed("search() building the index", lambda: storage.search("word42"), 1)
+    timed("search()", lambda: storage.search("word42 word7", 20))
+
+
+def bench_locations(size):
+    """The states with their cities and numbers of places, for 50 States
+    of 20 Cities and size Places, sorted each time and with locations()"""
+    storage = FileStorage()
+    FileStorage._FileStorage__objects = {}
+    cities = []
+    for i in range(50):
+        state = State(name=str(i))
+        storage.new(state)
+        for j in range(20):
+            cities.append(City(name=str(j), state_id=state.id))
+            storage.new(cities[-1])
+    for i in range(size):
+        storage.new(Place(name=str(i), city_id=cities[i % len(cities)].id))
+    timed("states and cities sorted, places found",
+          lambda: [(state, [(city, len(storage.find(Place,
+                                                    city_id=city.id)))
+                            for city in sorted(state.cities,
+                                               key=lambda c: c.name)])
+                   for state in sorted(storage.all(State).values(),
+                                       key=lambda s: s.name)], 3)
+    storage.locations()
+    timed("locations()", storage.locations)
+
+
+def bench_datetime(size):
+    """Parsing and building size BaseModel timestamps"""
+    dicts = [BaseModel().to_dict() for i in range(size)]
+    strings = [d["created_at"] for d in dicts if "." in d["created_at"]]
+    timed("datetime.strptime",
+          lambda: [datetime.strptime(s, "%Y-%m-%dT%H:%M:%S.%f")
+                   for s in strings], 3)
+    timed("datetime.fromisoformat",
+          lambda: [datetime.fromisoformat(s) for s in strings], 3)
+    timed("BaseModel(**kwargs)",
+          lambda: [BaseModel(**d) for d in dicts], 3)
+
+
+def bench_to_dict(size):
+    """to_dict() and to_json() of size States, then again memoized"""
+    states = [State(name="California") for i in range(size)]
+    timed("to_dict()", lambda: [s.to_dict() for s in states], 1)
+    timed("to_dict() memoized", lambda: [s.to_dict() for s in states], 3)
+    timed("to_json() memoized", lambda: [s.to_json() for s in states], 3)
+
+
+def bench_memory(size):
+    """Memory held by size Reviews, run with and without
+    HBNB_COMPACT_MODELS=1 to compare"""
+    from models.review import Review
+    tracemalloc.start()
+    reviews = [Review(place_id="p", user_id="u", text="Great")
+               for i in range(size)]
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("{:<40} {:>12.1f}B".format("memory per Review", current / size))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    bench_all_by_class(size)
+    bench_reload(size)
+    bench_search_places(size // 10)
+    bench_near(size // 10)
+    bench_price(size // 10)
+    bench_fulltext(size // 10)
+    bench_locations(size // 10)
+    bench_datetime(size)
+    bench_to_dict(size)
+    bench_memory(size)
@@ -1,6 +1,11 @@
 import unittest
 from datetime import datetime
+from models import base_model
 from models.base_model import BaseModel
+import json
+import os
+import subprocess
+import sys
 import uuid
 import time
 
@@ -74,6 +79,80 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(new_model.updated_at, self.model.updated_at)
         self.assertEqual(new_model.__str__(), self.model.__str__())
 
+    def test_kwargs_creation_without_microseconds(self):
+        """
+        Test creating an instance from timestamps with no microseconds.
+        """
+        model_dict = self.model.to_dict()
+        model_dict['created_at'] = "2017-09-28T21:03:54"
+        model_dict['updated_at'] = "2017-09-28T21:03:54.000012"
+        new_model = BaseModel(**model_dict)
+        self.assertEqual(new_model.created_at,
+                         datetime(2017, 9, 28, 21, 3, 54))
+        self.assertEqual(new_model.updated_at,
+                         datetime(2017, 9, 28, 21, 3, 54, 12))
+
+    def test_compact_mode_output(self):
+        """
+        Test that compact mode keeps the to_dict and __str__ output.
+        """
+        model_dict = self.model.to_dict()
+        model_dict['name'] = "California"
+        model = BaseModel(**model_dict)
+        script = ("import json, sys\n"
+                  "from models.base_model import BaseModel\n"
+                  "model = BaseModel(**json.loads(sys.argv[1]))\n"
+                  "print(json.dumps([model.to_dict(), str(model),"
+                  " hasattr(model, '__slots__')]))\n")
+        env = dict(os.environ, HBNB_COMPACT_MODELS="1",
+                   HBNB_TYPE_STORAGE="file")
+        out = subprocess.run([sys.executable, "-c", script,
+                              json.dumps(model_dict)], env=env,
+                             capture_output=True, text=True, check=True)
+        to_dict, string, slots = json.loads(out.stdout)
+        self.assertEqual(to_dict, model.to_dict())
+        self.assertEqual(string, str(model))
+        self.assertTrue(slots)
+
+    def test_to_dict_memoized(self):
+        """
+        Test that to_dict is memoized until an attribute is set.
+        """
+        first = self.model.to_dict()
+        first['name'] = "Changed"
+        self.assertNotIn('name', self.model.to_dict())
+        self.model.name = "California"
+        self.assertEqual(self.model.to_dict()['name'], "California")
+        self.assertEqual(json.loads(self.model.to_json()),
+                         self.model.to_dict())
+
+    def test_to_dict_password_variants(self):
+        """
+        Test that to_dict memoizes each include_password variant.
+        """
+        self.model.password = "secret"
+        self.assertNotIn('password', self.model.to_dict())
+        self.assertEqual(self.model.to_dict(include_password=True)
+                         ['password'], "secret")
+        self.assertNotIn('password', json.loads(self.model.to_json()))
+        self.model.password = "other"
+        self.assertEqual(json.loads(self.model.to_json(True))['password'],
+                         "other")
+
+    def test_to_dict_memo_bounded(self):
+        """
+        Test that saving does not memoize and the memo is bounded.
+        """
+        base_model.cache.clear()
+        self.model.save()
+        self.assertNotIn(self.model, base_model.cache)
+        models = [BaseModel() for i in range(base_model.memo_size + 1)]
+        for model in models:
+            model.to_dict()
+        self.assertEqual(len(base_model.cache), base_model.memo_size)
+        self.assertNotIn(models[0], base_model.cache)
+        self.assertIn(models[-1], base_model.cache)
+
     def test_kwargs_creation_exclude_class(self):
         """
         Test creating an instance with kwargs and ensure
@@ -93,6 +172,16 @@ class TestBaseModel(unittest.TestCase):
         self.assertIsInstance(new_model.created_at, datetime)
         self.assertIsInstance(new_model.updated_at, datetime)
 
+    def test_datetime_offset_to_utc(self):
+        """
+        Test that timestamps with a UTC offset are stored as naive UTC.
+        """
+        new_model = BaseModel(created_at="2020-01-01T02:00:00+02:00",
+                              updated_at="2020-01-01T00:00:00")
+        self.assertEqual(new_model.created_at, datetime(2020, 1, 1))
+        self.assertIsNone(new_model.created_at.tzinfo)
+        self.assertEqual(new_model.updated_at, datetime(2020, 1, 1))
+
     def test_id_is_string(self):
         """
         Test that id is a string.
@@ -4,13 +4,39 @@ Test for db_storage
 """
 
 import unittest
+import models
+from sqlalchemy import event, inspect
 from models.engine.db_storage import DBStorage
 from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
 """
 Import other necessary models
 """
 
 
+class QueryCounter:
+    """Counts the statements run on an engine inside a with block"""
+
+    def __init__(self, engine):
+        """Initialization of the counter"""
+        self.engine = engine
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.increment)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self.increment)
+
+    def increment(self, *args):
+        """Counts one statement"""
+        self.count += 1
+
+
+@unittest.skipIf(models.storage_t != "db", "needs HBNB_TYPE_STORAGE=db")
 class TestDBStorage(unittest.TestCase):
     def setUp(self):
         """Set up for tests."""
@@ -19,7 +45,8 @@ class TestDBStorage(unittest.TestCase):
 
     def test_get(self):
         """Test the get method."""
-        user = User(name="John Doe", email="john@example.com")
+        user = User(name="John Doe", email="john@example.com",
+                    password="pwd")
         self.storage.new(user)
         self.storage.save()
         retrieved_user = self.storage.get(User, user.id)
@@ -29,12 +56,143 @@ class TestDBStorage(unittest.TestCase):
     def test_count(self):
         """Test the count method."""
         initial_count = self.storage.count()
-        user = User(name="John Doe", email="john@example.com")
+        user = User(name="John Doe", email="john@example.com",
+                    password="pwd")
         self.storage.new(user)
         self.storage.save()
         self.assertEqual(self.storage.count(), initial_count + 1)
         self.assertEqual(self.storage.count(User), 1)
 
+    def test_all_eager_loading(self):
+        """Test that load fetches the relationships of all the objects
+        in one more query instead of one per object."""
+        for i in range(3):
+            state = State(name=str(i))
+            self.storage.new(state)
+            for j in range(2):
+                self.storage.new(City(name=str(j), state_id=state.id))
+        self.storage.save()
+        self.storage.reload()
+        engine = self.storage._DBStorage__engine
+        with QueryCounter(engine) as queries:
+            states = self.storage.all(State, load=("cities",)).values()
+            self.assertEqual(sum(len(state.cities) for state in states), 6)
+        self.assertEqual(queries.count, 2)
+
+    def test_get_eager_loading(self):
+        """Test that get loads the relationships of load along."""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.new(City(name="Fremont", state_id=state.id))
+        self.storage.save()
+        self.storage.reload()
+        engine = self.storage._DBStorage__engine
+        with QueryCounter(engine) as queries:
+            state = self.storage.get(State, state.id, load=("cities",))
+            self.assertEqual(len(state.cities), 1)
+        self.assertEqual(queries.count, 2)
+
+    def test_indexes(self):
+        """Test that reload creates the declared indexes, also on tables
+        that exist without them."""
+        engine = self.storage._DBStorage__engine
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "DROP INDEX ix_users_email ON users")
+        self.storage.reload()
+        indexes = {index["name"] for table in ("users", "places", "reviews")
+                   for index in inspect(engine).get_indexes(table)}
+        for name in ("ix_users_email", "ix_places_city_id_price_by_night",
+                     "ix_reviews_place_id", "ix_reviews_user_id"):
+            self.assertIn(name, indexes)
+
+    def test_search(self):
+        """Test that search follows the places as they are saved."""
+        state = State(name="California")
+        city = City(name="San Francisco", state_id=state.id)
+        user = User(email="john@example.com", password="pwd")
+        place = Place(name="Loft", description="quiet loft",
+                      city_id=city.id, user_id=user.id)
+        for obj in (state, city, user, place):
+            self.storage.new(obj)
+        self.storage.save()
+        self.assertEqual([obj for score, obj in self.storage.search("quiet")],
+                         [place])
+        place.description = "noisy loft"
+        self.storage.save()
+        self.assertEqual(self.storage.search("quiet"), [])
+        self.assertEqual(len(self.storage.search("noisy", cls=Place)), 1)
+
+    def test_search_refresh(self):
+        """Test that search sees the places other storages save and
+        skips those they delete."""
+        other = DBStorage()
+        other.reload()
+        state = State(name="California")
+        city = City(name="San Francisco", state_id=state.id)
+        user = User(email="john@example.com", password="pwd")
+        place = Place(name="Loft", description="quiet loft",
+                      city_id=city.id, user_id=user.id)
+        for obj in (state, city, user, place):
+            self.storage.new(obj)
+        self.storage.save()
+        self.assertEqual(len(self.storage.search("quiet")), 1)
+        barn = Place(name="Barn", description="quiet barn",
+                     city_id=city.id, user_id=user.id)
+        other.bulk_new([barn])
+        other.bulk_delete(Place, [place.id])
+        other.close()
+        self.storage.close()
+        self.assertEqual([obj.id for score, obj in
+                          self.storage.search("quiet")], [barn.id])
+        self.storage.close()
+
+    def test_version(self):
+        """Test that the versions follow the saves of other storages."""
+        other = DBStorage()
+        other.reload()
+        before = self.storage.version(State)
+        everything = self.storage.version()
+        other.new(State(name="Nevada"))
+        other.save()
+        other.close()
+        self.storage.close()
+        self.assertGreater(self.storage.version(State), before)
+        self.assertGreater(self.storage.version(), everything)
+        self.storage.close()
+
+    def test_locations(self):
+        """Test that the location tree follows the saves of other
+        storages."""
+        other = DBStorage()
+        other.reload()
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual([branch["cities"] for branch in
+                          self.storage.locations()], [[]])
+        other.new(City(name="San Francisco", state_id=state.id))
+        other.save()
+        other.close()
+        self.storage.close()
+        self.assertEqual([city["name"] for city in
+                          self.storage.locations()[0]["cities"]],
+                         ["San Francisco"])
+        self.storage.close()
+
+    def test_close(self):
+        """Test that close gives the connection back to the pool and a
+        new session takes over."""
+        user = User(name="John Doe", email="john@example.com",
+                    password="pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.storage.all(User)
+        self.storage.close()
+        self.assertEqual(self.storage.pool_status()["checked_out"], 0)
+        self.assertEqual(self.storage.get(User, user.id).id, user.id)
+        self.storage.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,8 +2,10 @@
 import unittest
 import os
 import json
+import threading
+from importlib.util import find_spec
 from models.base_model import BaseModel
-from models.engine.file_storage import FileStorage
+from models.engine.file_storage import FileStorage, serializer
 from models.user import User
 from models.state import State
 from models.city import City
@@ -170,9 +172,533 @@ class TestFileStorage(unittest.TestCase):
         """
         Set up for tests.
         """
+        FileStorage._FileStorage__objects = {}
         self.storage = FileStorage()
         self.storage.reload()
 
+    def test_all_by_class(self):
+        """
+        Test that all(cls) only returns objects of cls, read-only.
+        """
+        state = State()
+        city = City()
+        self.storage.new(state)
+        self.storage.new(city)
+        states = self.storage.all(State)
+        self.assertIn(f"State.{state.id}", states)
+        self.assertNotIn(f"City.{city.id}", states)
+        self.assertEqual(dict(self.storage.all("City")),
+                         dict(self.storage.all(City)))
+        with self.assertRaises(TypeError):
+            states["State.1"] = state
+        self.storage.delete(state)
+        self.assertNotIn(f"State.{state.id}", self.storage.all(State))
+
+    def test_find_by_foreign_key(self):
+        """
+        Test that find follows foreign keys, including updated ones.
+        """
+        state = State(name="California")
+        other = State(name="Nevada")
+        city = City(name="Fremont", state_id=state.id)
+        for obj in (state, other, city):
+            self.storage.new(obj)
+        self.assertEqual(self.storage.find(City, state_id=state.id), [city])
+        self.assertEqual(state.cities, [city])
+        city.state_id = other.id
+        self.assertEqual(state.cities, [])
+        self.assertEqual(other.cities, [city])
+        self.assertEqual(self.storage.find("City", state_id=other.id,
+                                           name="Oakland"), [])
+        self.storage.delete(city)
+        self.assertEqual(other.cities, [])
+
+    def test_search_places(self):
+        """
+        Test that search_places intersects states, cities and amenities.
+        """
+        state = State(name="California")
+        sf = City(name="San Francisco", state_id=state.id)
+        la = City(name="Los Angeles", state_id=state.id)
+        home = Place(name="Home", city_id=sf.id, amenity_ids=["wifi"])
+        loft = Place(name="Loft", city_id=la.id,
+                     amenity_ids=["wifi", "pool"])
+        for obj in (state, sf, la, home, loft):
+            self.storage.new(obj)
+        search = self.storage.search_places
+        self.assertCountEqual(search(), [home, loft])
+        self.assertCountEqual(search(states=[state.id]), [home, loft])
+        self.assertEqual(list(search(states=[state.id], cities=[sf.id])),
+                         [home])
+        self.assertEqual(list(search(cities=["unknown"])), [])
+        self.assertEqual(list(search(amenities=["wifi", "pool"])), [loft])
+        home.amenity_ids = ["pool", "wifi"]
+        self.assertCountEqual(search(amenities=["pool"]), [home, loft])
+        self.storage.delete(loft)
+        self.assertEqual(list(search(amenities=["pool"])), [home])
+
+    def test_search_places_by_location(self):
+        """
+        Test that search_places follows places as they move.
+        """
+        sf = Place(name="SF", latitude=37.7749, longitude=-122.4194)
+        oak = Place(name="Oakland", latitude=37.8044, longitude=-122.2712)
+        nowhere = Place(name="Nowhere")
+        for place in (sf, oak, nowhere):
+            self.storage.new(place)
+        search = self.storage.search_places
+        self.assertEqual(list(search(near=(37.77, -122.42, 5))), [sf])
+        self.assertCountEqual(search(near=(37.77, -122.42, 20)), [sf, oak])
+        self.assertEqual(list(search(bbox=(37.8, -123, 38, -122))), [oak])
+        oak.latitude = 0.0
+        self.assertEqual(list(search(near=(37.77, -122.42, 20))), [sf])
+        self.storage.delete(sf)
+        self.assertEqual(list(search(near=(37.77, -122.42, 20))), [])
+
+    def test_search_places_by_range(self):
+        """
+        Test that search_places bounds and orders places on numbers.
+        """
+        cheap = Place(name="cheap", price_by_night=50, max_guest=2)
+        mid = Place(name="mid", price_by_night=100, max_guest=4)
+        dear = Place(name="dear", price_by_night=300, max_guest=8)
+        for place in (dear, cheap, mid):
+            self.storage.new(place)
+        search = self.storage.search_places
+        price = {"price_by_night": (60, 300)}
+        self.assertCountEqual(search(ranges=price), [mid, dear])
+        self.assertEqual(list(search(ranges={"max_guest": (4, None)},
+                                     order="price_by_night")), [mid, dear])
+        self.assertEqual(list(search(order="price_by_night", limit=2)),
+                         [cheap, mid])
+        after = (100, mid.created_at, mid.id)
+        self.assertEqual(list(search(order="price_by_night", after=after)),
+                         [dear])
+        dear.price_by_night = 20
+        self.assertEqual(list(search(order="price_by_night", limit=1)),
+                         [dear])
+        self.assertEqual(list(search(ranges=price)), [mid])
+        self.storage.delete(mid)
+        self.assertEqual(list(search(ranges=price)), [])
+
+    def test_search_places_descending(self):
+        """
+        Test that search_places orders places on a number descending and
+        follows its changes.
+        """
+        places = [Place(name=str(i), review_count=i) for i in range(3)]
+        for place in places:
+            self.storage.new(place)
+        search = self.storage.search_places
+        self.assertEqual(list(search(order="-review_count")),
+                         places[::-1])
+        places[0].review_count = 5
+        self.assertEqual(list(search(order="-review_count", limit=2)),
+                         [places[0], places[2]])
+        after = (-2, places[2].created_at, places[2].id)
+        self.assertEqual(list(search(order="-review_count", after=after)),
+                         [places[1]])
+
+    def test_locations(self):
+        """
+        Test that locations keeps states and cities sorted by name as
+        they change and counts their places.
+        """
+        ca = State(name="California")
+        nv = State(name="Nevada")
+        sf = City(name="San Francisco", state_id=ca.id)
+        reno = City(name="Reno", state_id=nv.id)
+        for obj in (nv, ca, sf, reno, Place(city_id=sf.id),
+                    Place(city_id=reno.id), Place(city_id=reno.id)):
+            self.storage.new(obj)
+
+        def tree():
+            """Returns the names and numbers of places of the tree"""
+            return [(state["name"], state["places"],
+                     [(city["name"], city["places"])
+                      for city in state["cities"]])
+                    for state in self.storage.locations()]
+        self.assertEqual(tree(), [("California", 1, [("San Francisco", 1)]),
+                                  ("Nevada", 2, [("Reno", 2)])])
+        ca.name = "Oregon"
+        reno.state_id = ca.id
+        la = City(name="Los Angeles", state_id=nv.id)
+        self.storage.new(la)
+        self.storage.delete(sf)
+        self.assertEqual(tree(), [("Nevada", 0, [("Los Angeles", 0)]),
+                                  ("Oregon", 2, [("Reno", 2)])])
+
+    def test_search(self):
+        """
+        Test that search follows the places and reviews as they change
+        and reloads its index from the file saved with the snapshot.
+        """
+        loft = Place(name="Loft", description="quiet loft near the park")
+        barn = Place(name="Barn", description="a barn")
+        review = Review(text="Lovely quiet stay")
+        for obj in (loft, barn, review):
+            self.storage.new(obj)
+        search = self.storage.search
+        self.assertEqual([obj for score, obj in search("quiet")],
+                         [review, loft])
+        self.assertEqual([obj for score, obj in search("quiet", cls=Place)],
+                         [loft])
+        barn.description = "quiet barn"
+        self.assertEqual(len(search("quiet", 2)), 2)
+        self.assertEqual(len(search("quiet")), 3)
+        self.storage.delete(review)
+        self.assertEqual(len(search("lovely")), 0)
+        try:
+            self.storage.save()
+            self.assertTrue(os.path.exists("file.json.fts"))
+            FileStorage._FileStorage__fulltext = None
+            self.assertEqual(len(search("quiet")), 2)
+        finally:
+            os.remove("file.json.fts")
+
+    def test_page(self):
+        """
+        Test that page walks the objects in (created_at, id) order.
+        """
+        states = [State(name=str(i)) for i in range(5)]
+        states.sort(key=lambda state: (state.created_at, state.id))
+        for state in reversed(states):
+            self.storage.new(state)
+        self.assertEqual(list(self.storage.page(State)), states)
+        first = list(self.storage.page(State, 2))
+        self.assertEqual(first, states[:2])
+        after = (first[-1].created_at, first[-1].id)
+        self.assertEqual(list(self.storage.page("State", 2, after)),
+                         states[2:4])
+        self.storage.delete(states[2])
+        late = State(name="late")
+        self.storage.new(late)
+        self.assertEqual(list(self.storage.page(State, None, after)),
+                         [states[3], states[4], late])
+        city = City(name="Fremont", state_id=states[0].id)
+        self.storage.new(city)
+        self.assertEqual(list(self.storage.page(City, 1,
+                                                state_id=states[0].id)),
+                         [city])
+        self.assertEqual(list(self.storage.page(City, 1, state_id="none")),
+                         [])
+
+    def test_page_iterates_lazily(self):
+        """
+        Test that page keeps its place while objects change under it.
+        """
+        states = [State(name=str(i)) for i in range(2500)]
+        states.sort(key=lambda state: (state.created_at, state.id))
+        for state in states:
+            self.storage.new(state)
+        walk = self.storage.page(State)
+        self.assertEqual(next(walk), states[0])
+        self.storage.delete(states[1500])
+        late = State(name="late")
+        self.storage.new(late)
+        self.assertEqual(list(walk),
+                         states[1:1500] + states[1501:] + [late])
+        self.assertEqual(len(list(self.storage.page(State, 1200))), 1200)
+
+    def test_version(self):
+        """
+        Test that version changes with the objects of its class only.
+        """
+        state = State(name="California")
+        versions = (self.storage.version(State), self.storage.version(City),
+                    self.storage.version())
+        self.storage.new(state)
+        self.assertNotEqual(self.storage.version("State"), versions[0])
+        self.assertEqual(self.storage.version(City), versions[1])
+        self.assertNotEqual(self.storage.version(), versions[2])
+        versions = self.storage.version(State), self.storage.version()
+        state.name = "Nevada"
+        self.assertNotEqual(self.storage.version(State), versions[0])
+        versions = self.storage.version(State), self.storage.version()
+        self.storage.delete(state)
+        self.assertNotEqual(self.storage.version(State), versions[0])
+        self.assertNotEqual(self.storage.version(), versions[1])
+        versions = self.storage.version(State), self.storage.version()
+        State(name="Texas").name = "Utah"
+        state.name = "Ohio"
+        self.assertEqual((self.storage.version(State),
+                          self.storage.version()), versions)
+
+    def test_counts(self):
+        """
+        Test that counts gives the count of every class at once.
+        """
+        for obj in (State(), State(), City()):
+            self.storage.new(obj)
+        counts = self.storage.counts()
+        self.assertEqual(counts["State"], 2)
+        self.assertEqual(counts["City"], 1)
+        self.assertEqual(counts["Review"], 0)
+        self.assertEqual(counts, {cls: self.storage.count(cls)
+                                  for cls in counts})
+
+    def test_close(self):
+        """
+        Test that close keeps the objects without reading the file.
+        """
+        state = State()
+        self.storage.new(state)
+        self.storage.close()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_bulk_new_and_delete(self):
+        """
+        Test that bulk_new and bulk_delete save once for many objects.
+        """
+        states = [State(name=str(i)) for i in range(3)]
+        self.storage.bulk_new(states)
+        with open(self.file_path, "r") as f:
+            self.assertEqual(len(json.load(f)), 3)
+        ids = [states[0].id, states[1].id, "unknown"]
+        self.assertEqual(self.storage.bulk_delete(State, ids), 2)
+        self.assertEqual(list(self.storage.all(State).values()), [states[2]])
+        with open(self.file_path, "r") as f:
+            self.assertEqual(list(json.load(f)), ["State." + states[2].id])
+
+    def test_transaction(self):
+        """
+        Test that a transaction saves once, or undoes its changes.
+        """
+        state = State(name="California")
+        gone = State(name="Nevada")
+        self.storage.new(state)
+        self.storage.new(gone)
+        self.storage.save()
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                state.name = "Oregon"
+                self.storage.new(City(name="Fremont", state_id=state.id))
+                self.storage.delete(gone)
+                self.storage.save()
+                raise ValueError
+        self.assertEqual(self.storage.get(State, state.id).name,
+                         "California")
+        self.assertEqual(self.storage.get(State, gone.id).name, "Nevada")
+        self.assertEqual(self.storage.count(City), 0)
+        with self.storage.transaction():
+            self.storage.new(City(name="Fremont", state_id=state.id))
+            self.storage.save()
+            with open(self.file_path, "r") as f:
+                self.assertNotIn("City.", f.read())
+        with open(self.file_path, "r") as f:
+            self.assertIn("City.", f.read())
+
+    def test_snapshot_one_record_per_line(self):
+        """
+        Test that the snapshot is JSON with one record per line.
+        """
+        states = [State(name=str(i)) for i in range(3)]
+        for state in states:
+            self.storage.new(state)
+        self.storage.save()
+        with open(self.file_path, "r") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "{")
+        self.assertEqual(lines[-1], "}")
+        self.assertEqual(len(lines), 5)
+
+    def test_reload_progress(self):
+        """
+        Test that reload reports its progress through the file.
+        """
+        self.storage.new(State(name="California"))
+        self.storage.save()
+        calls = []
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload(progress=lambda done, size:
+                            calls.append((done, size)))
+        size = os.path.getsize(self.file_path)
+        self.assertEqual(calls, [(size, size)])
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_reload_fills_aggregates(self):
+        """
+        Test that reload computes the aggregates of places saved
+        without them.
+        """
+        place = Place(name="Loft", amenity_ids=["wifi"])
+        reviews = [Review(place_id=place.id, text=str(i)) for i in range(2)]
+        for obj in [place] + reviews:
+            self.storage.new(obj)
+        self.storage.save()
+        with open(self.file_path) as f:
+            records = json.load(f)
+        for name in ("review_count", "amenity_count", "last_review_at"):
+            del records["Place." + place.id][name]
+        with open(self.file_path, "w") as f:
+            json.dump(records, f)
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        place = self.storage.get(Place, place.id)
+        self.assertEqual(place.review_count, 2)
+        self.assertEqual(place.amenity_count, 1)
+        self.assertEqual(place.last_review_at,
+                         max(review.created_at for review in reviews))
+
+    def test_reload_single_line_snapshot(self):
+        """
+        Test that reload still reads a snapshot written on one line.
+        """
+        state = State(name="California")
+        with open(self.file_path, "w") as f:
+            json.dump({f"State.{state.id}": state.to_dict()}, f)
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name,
+                         "California")
+
+    def test_lazy_reload(self):
+        """
+        Test that lazy mode only builds instances when accessed.
+        """
+        state = State(name="California")
+        city = City(name="Fremont", state_id=state.id)
+        self.storage.new(state)
+        self.storage.new(city)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        FileStorage._FileStorage__lazy = True
+        try:
+            self.storage.reload()
+            objects = FileStorage._FileStorage__objects
+            self.assertEqual(len(objects), 0)
+            self.assertEqual(self.storage.count(), 2)
+            self.assertEqual(self.storage.get(State, state.id).name,
+                             "California")
+            self.assertEqual(list(objects), [f"State.{state.id}"])
+            self.assertIn(f"City.{city.id}", self.storage.all(City))
+            self.assertEqual(self.storage.count(), 2)
+        finally:
+            FileStorage._FileStorage__lazy = False
+            FileStorage._FileStorage__raw.clear()
+
+    @unittest.skipUnless(find_spec("msgpack"), "msgpack is not installed")
+    def test_convert_to_msgpack(self):
+        """
+        Test that a JSON file is converted to msgpack on reload.
+        """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        FileStorage._FileStorage__serializer = serializer("msgpack")
+        try:
+            FileStorage._FileStorage__objects = {}
+            self.storage.reload()
+            with open(self.file_path, "rb") as f:
+                self.assertEqual(f.read(1), b"\x81")
+            self.storage.new(City(name="Fremont", state_id=state.id))
+            self.storage.save()
+            FileStorage._FileStorage__objects = {}
+            self.storage.reload()
+            self.assertEqual(self.storage.get(State, state.id).name,
+                             "California")
+            self.assertEqual(len(state.cities), 1)
+        finally:
+            FileStorage._FileStorage__serializer = serializer("json")
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(), 2)
+        with open(self.file_path, "r") as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    @unittest.skipUnless(find_spec("orjson"), "orjson is not installed")
+    def test_orjson(self):
+        """
+        Test that orjson reads and writes the same format as json.
+        """
+        FileStorage._FileStorage__serializer = serializer("orjson")
+        try:
+            state = State(name="California")
+            self.storage.new(state)
+            self.storage.save()
+            FileStorage._FileStorage__objects = {}
+            self.storage.reload()
+        finally:
+            FileStorage._FileStorage__serializer = serializer("json")
+        self.assertEqual(self.storage.get(State, state.id).name, "California")
+        with open(self.file_path, "r") as f:
+            self.assertIn(f"State.{state.id}", json.load(f))
+
+    def test_save_is_atomic(self):
+        """
+        Test that save writes a temporary file and renames it.
+        """
+        self.storage.new(State(name="California"))
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.file_path + ".tmp"))
+        with open(self.file_path, "r") as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+    def test_reload_recovers_complete_snapshot(self):
+        """
+        Test that reload puts a complete leftover snapshot in place.
+        """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        os.rename(self.file_path, self.file_path + ".tmp")
+        with open(self.file_path, "w") as f:
+            json.dump({}, f)
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(State, state.id))
+        self.assertFalse(os.path.exists(self.file_path + ".tmp"))
+
+    def test_reload_drops_partial_snapshot(self):
+        """
+        Test that reload ignores a snapshot truncated by a crash.
+        """
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.new(State(name="Nevada"))
+        self.storage.new(State(name="Texas"))
+        self.storage.compact()
+        with open(self.file_path, "r") as f:
+            lines = f.readlines()
+        with open(self.file_path + ".tmp", "w") as f:
+            f.writelines(lines[:2])
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 3)
+        self.assertFalse(os.path.exists(self.file_path + ".tmp"))
+
+    def test_concurrent_saves_share_writes(self):
+        """
+        Test that saves made while a write is running are grouped.
+        """
+        writes = []
+        snapshot = FileStorage._FileStorage__serializer.write_snapshot
+
+        def write_snapshot(f, items, count):
+            writes.append(count)
+            snapshot(f, items, count)
+
+        FileStorage._FileStorage__serializer.write_snapshot = write_snapshot
+        FileStorage._FileStorage__commit_window = 0.05
+
+        def create():
+            self.storage.new(State())
+            self.storage.save()
+
+        try:
+            threads = [threading.Thread(target=create) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            FileStorage._FileStorage__commit_window = 0
+            del FileStorage._FileStorage__serializer.write_snapshot
+        self.assertLess(len(writes), 10)
+        with open(self.file_path, "r") as f:
+            self.assertEqual(len(json.load(f)), 10)
+
     def test_get(self):
         """
         Test the get method.
@@ -196,5 +722,96 @@ class TestFileStorage(unittest.TestCase):
         self.assertEqual(self.storage.count(User), 1)
 
 
+class TestFileStorageJournal(unittest.TestCase):
+    """
+    Test cases for the journal mode of the FileStorage class.
+    """
+
+    def setUp(self):
+        """
+        Set up a storage in journal mode.
+        """
+        FileStorage._FileStorage__journal = True
+        self.storage = FileStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Leave journal mode and remove the files.
+        """
+        FileStorage._FileStorage__journal = False
+        for path in ("file.json", "file.json.log"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_save_appends_to_journal(self):
+        """
+        Test that only the changed objects are appended to the journal.
+        """
+        self.storage.save()
+        snapshot = os.path.getmtime("file.json")
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        with open("file.json.log", "r") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["key"], "State." + state.id)
+        self.assertEqual(os.path.getmtime("file.json"), snapshot)
+
+    def test_unstored_objects_not_journaled(self):
+        """
+        Test that changing an object that is not stored does not mark it
+        for the journal.
+        """
+        state = State(name="California")
+        state.name = "Nevada"
+        self.assertNotIn(state, FileStorage._FileStorage__dirty)
+        self.storage.new(state)
+        self.storage.save()
+        state.name = "Utah"
+        self.assertIn(state, FileStorage._FileStorage__dirty)
+
+    def test_reload_replays_journal(self):
+        """
+        Test that reload restores updates and deletions from the journal.
+        """
+        self.storage.save()
+        state = State(name="California")
+        city = City(name="Fremont")
+        self.storage.new(state)
+        self.storage.new(city)
+        self.storage.save()
+        state.name = "Nevada"
+        self.storage.delete(city)
+        self.storage.save()
+        del self.storage.all()["State." + state.id]
+        self.storage.reload()
+        self.assertEqual(self.storage.all()["State." + state.id].name,
+                         "Nevada")
+        self.assertNotIn("City." + city.id, self.storage.all())
+
+    def test_compaction(self):
+        """
+        Test that the journal is folded into the snapshot at its limit.
+        """
+        FileStorage._FileStorage__journal_limit = 2
+        try:
+            self.storage.save()
+            self.storage.new(State(name="Texas"))
+            self.storage.save()
+            self.assertTrue(os.path.exists("file.json.log"))
+            state = State(name="Utah")
+            self.storage.new(state)
+            self.storage.save()
+        finally:
+            FileStorage._FileStorage__journal_limit = 1000
+        self.assertFalse(os.path.exists("file.json.log"))
+        with open("file.json", "r") as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+
 if __name__ == '__main__':
     unittest.main()
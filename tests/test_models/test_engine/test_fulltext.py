@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""
+Test for the full-text index of the storage engines
+"""
+import os
+import unittest
+from models.engine import fulltext
+
+
+class TestFullText(unittest.TestCase):
+    """
+    Test tokenizing, scoring and persisting the full-text index.
+    """
+
+    def test_tokenize(self):
+        """
+        Test that words are lowercased and stripped of their accents.
+        """
+        self.assertEqual(fulltext.tokenize("Café, NEAR the Beach!"),
+                         ["cafe", "near", "the", "beach"])
+
+    def test_search(self):
+        """
+        Test that more frequent words and shorter texts score higher.
+        """
+        index = fulltext.FullTextIndex()
+        index.add("Place.1", "quiet loft with a view")
+        index.add("Place.2", "loft loft near the station")
+        index.add("Review.1", "the view was great")
+        keys = [key for score, key in index.search("loft")]
+        self.assertEqual(keys, ["Place.2", "Place.1"])
+        self.assertEqual(index.search("view", 1)[0][1], "Review.1")
+        self.assertEqual([key for score, key in
+                          index.search("view", cls="Review")], ["Review.1"])
+        self.assertEqual(index.search("castle"), [])
+        index.remove("Place.2")
+        self.assertEqual([key for score, key in index.search("loft")],
+                         ["Place.1"])
+        self.assertNotIn("station", index.postings)
+
+    def test_write_load_sync(self):
+        """
+        Test that a written index is loaded back and synced with the
+        current texts.
+        """
+        path = "test_fulltext.fts"
+        index = fulltext.FullTextIndex()
+        index.add("Place.1", "quiet loft")
+        index.add("Place.2", "noisy loft")
+        try:
+            fulltext.write(path, index.snapshot())
+            loaded = fulltext.FullTextIndex()
+            loaded.load(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(loaded.search("loft"), index.search("loft"))
+        loaded.sync({"Place.1": "quiet loft", "Place.3": "quiet barn"})
+        self.assertEqual(sorted(loaded.documents), ["Place.1", "Place.3"])
+        self.assertEqual(len(loaded.search("quiet")), 2)
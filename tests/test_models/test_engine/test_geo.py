@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+Test for the geographic helpers of the storage engines
+"""
+import unittest
+from models.engine import geo
+
+
+class TestGeo(unittest.TestCase):
+    """
+    Test distances, boxes and the grid index.
+    """
+
+    def test_haversine(self):
+        """
+        Test the distance between San Francisco and Los Angeles.
+        """
+        distance = geo.haversine(37.7749, -122.4194, 34.0522, -118.2437)
+        self.assertAlmostEqual(distance, 559, delta=1)
+        self.assertEqual(geo.haversine(10, 20, 10, 20), 0)
+
+    def test_boxes_across_antimeridian(self):
+        """
+        Test that boxes across the antimeridian are split in two.
+        """
+        self.assertEqual(geo.boxes(-20, 179, 0, -179),
+                         [(-20, 179, 0, 180.0), (-20, -180.0, 0, -179)])
+        self.assertEqual(len(geo.around(0, 179.95, 20)), 2)
+        self.assertEqual(geo.around(89.9, 0, 50),
+                         [(geo.around(89.9, 0, 50)[0][0], -180.0,
+                           90.0, 180.0)])
+
+    def test_grid(self):
+        """
+        Test that the grid finds the points within a radius or a box.
+        """
+        grid = geo.Grid()
+        grid.add("sf", 37.7749, -122.4194)
+        grid.add("oak", 37.8044, -122.2712)
+        grid.add("fiji", -17.7, 179.9)
+        self.assertEqual(grid.near(37.77, -122.42, 5), {"sf"})
+        self.assertEqual(grid.near(37.77, -122.42, 20), {"sf", "oak"})
+        self.assertEqual(grid.near(-17.7, -179.95, 20), {"fiji"})
+        self.assertEqual(grid.within((-90, -180, 90, 180)),
+                         {"sf", "oak", "fiji"})
+        grid.add("oak", 0, 0)
+        grid.remove("sf")
+        self.assertEqual(grid.near(37.77, -122.42, 20), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -97,6 +97,21 @@ class TestPlace(unittest.TestCase):
         self.assertEqual(place_dict["updated_at"],
                          self.place.updated_at.isoformat())
 
+    def test_to_dict_aggregates(self):
+        """
+        Test that to_dict gives the aggregates, defaulted and serialized.
+        """
+        place_dict = self.place.to_dict()
+        self.assertEqual(place_dict["review_count"], 0)
+        self.assertEqual(place_dict["amenity_count"], 0)
+        self.assertIsNone(place_dict["last_review_at"])
+        self.place.last_review_at = self.place.created_at
+        place_dict = self.place.to_dict()
+        self.assertEqual(place_dict["last_review_at"],
+                         self.place.created_at.isoformat())
+        self.assertEqual(Place(**place_dict).last_review_at,
+                         self.place.created_at)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,7 +5,6 @@ Flask web application for AirBnB clone - Web dynamic.
 
 from flask import Flask, render_template
 from models import storage
-from models.state import State
 from models.amenity import Amenity
 
 app = Flask(__name__)
@@ -17,8 +16,7 @@ def hbnb_filters():
     Display a HTML page like 6-index.html, with States,
     Cities and Amenities filters.
     """
-    states = sorted(storage.all(State).values(),
-                    key=lambda state: state.name)
+    states = storage.locations()
     amenities = sorted(storage.all(Amenity).values(),
                        key=lambda amenity: amenity.name)
     return render_template('10-hbnb_filters.html', states=states,
@@ -5,7 +5,6 @@ Flask web application for AirBnB clone - Web dynamic.
 
 from flask import Flask, render_template
 from models import storage
-from models.state import State
 from models.amenity import Amenity
 from models.place import Place
 
@@ -18,8 +17,7 @@ def hbnb():
     Display a HTML page like 8-index.html, with States,
     Cities, Amenities, and Places.
     """
-    states = sorted(storage.all(State).values(),
-                    key=lambda state: state.name)
+    states = storage.locations()
     amenities = sorted(storage.all(Amenity).values(),
                        key=lambda amenity: amenity.name)
     places = sorted(storage.all(Place).values(),